@@ -0,0 +1,169 @@
+from collections import OrderedDict
+from contextlib import aclosing
+import tkinter as tk
+
+from prompt_builder import build_stable_prompt
+from service_loop import PRIORITY_DEFAULT
+
+# Keys that never change the text or the cursor, so they neither clear nor trigger a suggestion
+MODIFIER_KEYS = {"Shift_L", "Shift_R", "Control_L", "Control_R", "Alt_L", "Alt_R", "Caps_Lock", "Super_L", "Super_R"}
+
+class PrefixCache:
+    """
+    Completions keyed by the text before the cursor.
+
+    A lookup also succeeds when the user has typed the first characters of a cached suggestion,
+    returning the rest of it, so backspacing and retyping never refetches.
+    """
+    def __init__(self, max_entries=256, max_lookback=64):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.max_lookback = max_lookback
+
+    def put(self, prefix, completion):
+        self.entries[prefix] = completion
+        self.entries.move_to_end(prefix)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, prefix):
+        if prefix in self.entries:
+            self.entries.move_to_end(prefix)
+            return self.entries[prefix]
+        for typed in range(1, min(self.max_lookback, len(prefix)) + 1):
+            completion = self.entries.get(prefix[:-typed])
+            if completion is not None and completion.startswith(prefix[-typed:]) and len(completion) > typed:
+                return completion[typed:]
+        return None
+
+class GhostCompleter:
+    """
+    Inline autocompletion shown as dimmed ghost text at the cursor.
+
+    After the user pauses typing for delay_ms, a short completion is streamed into the editor with
+    the 'ghost' tag and Tab accepts it. Any other key or click removes the ghost and cancels the
+    request in flight, so superseded requests never keep a backend slot busy. Ghost edits bypass the
+    undo stack; accepting inserts the suggestion as one ordinary, undoable edit.
+    """
+    def __init__(self, app, tab, enabled, delay_ms=400, max_tokens=16, context_chars=4000):
+        self.app = app
+        self.tab = tab
+        self.widget = tab.text_widget
+        self.delay_ms = delay_ms
+        self.max_tokens = max_tokens
+        self.context_chars = context_chars
+        self.enabled = enabled  # BooleanVar shared by all tabs
+        self.cache = PrefixCache()
+        self.pending = None  # after() id of the debounce timer
+        self.job = None
+        self.request_id = 0
+        self.active = False  # ghost text currently shown
+
+        self.widget.tag_config('ghost', foreground='gray')
+        self.widget.bind("<KeyPress>", self.on_key, add="+")
+        self.widget.bind("<Button-1>", lambda event: self.clear(), add="+")
+
+    def on_key(self, event):
+        if event.keysym in MODIFIER_KEYS:
+            return None
+        if event.keysym == "Tab" and self.active:
+            self.accept()
+            return "break"
+        self.clear()
+        if self.enabled.get():
+            self.pending = self.widget.after(self.delay_ms, self.suggest)
+        return None
+
+    def clear(self):
+        """Remove the ghost text and abort any pending or in-flight suggestion."""
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+            self.pending = None
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+        self.request_id += 1
+        if self.active:
+            self.without_undo(self.widget.delete, "ghost_start", "ghost_end")
+            self.active = False
+
+    def without_undo(self, edit, *args):
+        """Apply an edit of the ghost text without recording it on the editor's undo stack."""
+        undo = self.widget.cget("undo")
+        self.widget.config(undo=False)
+        try:
+            edit(*args)
+        finally:
+            self.widget.config(undo=undo)
+
+    def accept(self):
+        text = self.widget.get("ghost_start", "ghost_end")
+        self.without_undo(self.widget.delete, "ghost_start", "ghost_end")
+        self.widget.edit_separator()
+        self.widget.insert("ghost_start", text)  # ghost_end has right gravity and ends up after it
+        self.widget.edit_separator()
+        self.widget.mark_set(tk.INSERT, "ghost_end")
+        self.widget.see(tk.INSERT)
+        self.active = False
+        self.request_id += 1  # late chunks of the accepted request must not be appended
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+
+    def suggest(self):
+        self.pending = None
+        if self.tab.generating:
+            return  # never compete with a full generation
+        context = self.widget.get(f"insert - {self.context_chars} chars", tk.INSERT)
+        if not context.strip():
+            return
+
+        self.widget.mark_set("ghost_start", tk.INSERT)
+        self.widget.mark_gravity("ghost_start", tk.LEFT)
+        self.widget.mark_set("ghost_end", tk.INSERT)
+        self.widget.mark_gravity("ghost_end", tk.RIGHT)
+
+        cached = self.cache.get(context)
+        if cached is not None:
+            self.show(self.request_id, cached)
+            return
+
+        data = self.app.build_request_data(self.prompt(context))
+        data.update(max_tokens=self.max_tokens, stop=["\n"])
+        request_id = self.request_id
+        self.job = self.app.service.submit(
+            lambda session: self.stream(session, data, request_id, context), PRIORITY_DEFAULT)
+
+    def prompt(self, context):
+        """
+        Memory, lorebook and the summary and passages of the last full prompt, then the text before the cursor.
+
+        The context sections are rendered once until the next generation or Story Info change, and
+        the prompt always ends exactly at the cursor, without author notes after it.
+        """
+        tab = self.tab
+        if tab.completion_prefix is None:
+            summary_text, retrieved_text, lorebook_entries = tab.context_sections or ("", "", tab.lorebook_entries_data)
+            order = tab.prompt_assembler.pin_lorebook_order(lorebook_entries)
+            tab.completion_prefix = build_stable_prompt("", tab.memory_text, "", lorebook_entries, order, summary_text,
+                                                        retrieved_text)
+        return "\n".join(part for part in (tab.completion_prefix, context) if part)
+
+    async def stream(self, session, data, request_id, context):
+        chunks = []
+        async with aclosing(self.app.open_completion_stream(session, data)) as stream:
+            async for payload in stream:
+                chunk = payload.get('choices', [{}])[0].get('text')
+                if chunk:
+                    chunks.append(chunk)
+                    self.app.bridge.post(self.show, request_id, chunk)
+        if chunks:
+            self.app.bridge.post(self.cache.put, context, "".join(chunks))
+
+    def show(self, request_id, text):
+        if request_id != self.request_id:
+            return  # superseded by newer typing
+        cursor = self.widget.index(tk.INSERT)
+        self.without_undo(self.widget.insert, "ghost_end", text, 'ghost')
+        self.widget.mark_set(tk.INSERT, cursor)  # keep the caret where the user left it
+        self.active = True
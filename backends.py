@@ -0,0 +1,234 @@
+import asyncio,re,time
+from collections import deque
+import aiohttp
+from rate_limiter import limiter_for
+
+DEFAULT_BASE_URL = "https://api.totalgpt.ai"
+# Number of recent time-to-first-token samples kept per backend
+TTFT_WINDOW = 50
+# Samples needed before a backend's latency percentile is trusted for hedging
+MIN_HEDGE_SAMPLES = 5
+# Consecutive failures after which a backend is tried only when every healthy one failed
+MAX_FAILURES = 3
+# Parameter counts in model names, e.g. "8x7B" or "70B"
+MODEL_SIZE_PATTERN = re.compile(r'(\d+)x(\d+)[bB]|(\d+)[bB]', re.IGNORECASE)
+
+def is_request_error(error):
+    """Whether a failure lies in the request itself (4xx other than 429), so another backend would fail too."""
+    return isinstance(error, aiohttp.ClientResponseError) and 400 <= error.status < 500 and error.status != 429
+
+def model_size(model_name):
+    match = MODEL_SIZE_PATTERN.search(model_name)
+    if match:
+        if match.group(1) and match.group(2):  # multiplied size
+            return int(match.group(1)) * int(match.group(2))
+        return int(match.group(3))  # direct size
+    return float('inf')  # place at the end
+
+def group_models_by_size(models):
+    """Sort models by parameter count and then alphabetically, unknown sizes last."""
+    return sorted(models, key=lambda name: (model_size(name), name))
+
+class Backend:
+    """One OpenAI-compatible endpoint with its own key, model list and latency statistics."""
+    def __init__(self, name, base_url, api_key="", models=None, tts=False, requests_per_minute=60, max_concurrency=4):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        # Entries sharing an endpoint and key share one limiter, since the provider limits the key
+        self.limiter = limiter_for((self.base_url, api_key), name, requests_per_minute, max_concurrency)
+        self.configured_models = set(models or [])
+        self.models = set(self.configured_models)
+        self.tts = tts
+        self.ttft_samples = deque(maxlen=TTFT_WINDOW)
+        self.failures = 0
+        self.healthy = True
+
+    @property
+    def headers(self):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def serves(self, model):
+        # A backend whose model list is still unknown is assumed to serve everything
+        return not self.models or model in self.models
+
+    def mean_ttft(self):
+        if not self.ttft_samples:
+            return 0.0  # unmeasured backends sort first so they get measured
+        return sum(self.ttft_samples) / len(self.ttft_samples)
+
+    def ttft_percentile(self, percentile):
+        if len(self.ttft_samples) < MIN_HEDGE_SAMPLES:
+            return None
+        samples = sorted(self.ttft_samples)
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+    def record_success(self, ttft):
+        self.ttft_samples.append(ttft)
+        self.failures = 0
+        self.healthy = True
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= MAX_FAILURES:
+            self.healthy = False
+
+def load_backends(config):
+    """
+    Build the backend list from config['BACKENDS'].
+
+    Without that key a single backend is synthesized from INFERMATIC_API_KEY so older configs keep working.
+    RATE_LIMIT supplies default requests_per_minute/max_concurrency, which each entry may override.
+    """
+    limits = {"requests_per_minute": 60, "max_concurrency": 4, **config.get('RATE_LIMIT', {})}
+    entries = config.get('BACKENDS') or [{
+        "name": "Infermatic",
+        "base_url": DEFAULT_BASE_URL,
+        "api_key": config.get('INFERMATIC_API_KEY', ''),
+        "tts": True,
+    }]
+    return [
+        Backend(entry.get('name', entry['base_url']), entry['base_url'], entry.get('api_key', ''),
+                entry.get('models'), entry.get('tts', False),
+                entry.get('requests_per_minute', limits['requests_per_minute']),
+                entry.get('max_concurrency', limits['max_concurrency']))
+        for entry in entries
+    ]
+
+class BackendRouter:
+    """
+    Picks backends by measured time-to-first-token, fails over on errors and optionally hedges.
+
+    A hedged request starts the same completion on the next backend once the first one has been
+    silent for longer than its own TTFT percentile; whichever produces a token first is kept.
+    """
+    def __init__(self, backends, hedge=False, hedge_percentile=90):
+        self.backends = backends
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+
+    def candidates(self, model):
+        serving = [backend for backend in self.backends if backend.serves(model)]
+        return sorted(serving, key=lambda backend: (not backend.healthy, backend.mean_ttft()))
+
+    def model_names(self):
+        names = []
+        for backend in self.backends:
+            names.extend(name for name in backend.models if name not in names)
+        return names
+
+    async def refresh(self, fetch_models):
+        """Health-check every backend by listing its models; fetch_models(backend) returns None on failure."""
+        results = await asyncio.gather(*(fetch_models(backend) for backend in self.backends), return_exceptions=True)
+        for backend, models in zip(self.backends, results):
+            if isinstance(models, Exception):
+                print(f"Health check of {backend.name} failed: {models!r}")
+                models = None
+            if models is None:
+                backend.record_failure()
+            else:
+                backend.healthy = True
+                backend.failures = 0
+                backend.models = self.filter_models(backend, models)
+        return self.model_names()
+
+    @staticmethod
+    def filter_models(backend, fetched):
+        # An explicit model list in config restricts what is routed to that backend
+        if backend.configured_models:
+            return backend.configured_models & set(fetched) or backend.configured_models
+        return set(fetched)
+
+    async def _first_token(self, backend, open_stream):
+        stream = open_stream(backend)
+        start = time.perf_counter()
+        try:
+            first = await anext(stream, None)  # None means the backend sent an empty completion
+        except BaseException:
+            await stream.aclose()
+            raise
+        backend.record_success(time.perf_counter() - start)
+        return stream, first
+
+    async def stream(self, model, open_stream):
+        """
+        Yield payloads from the fastest available backend for model.
+
+        Connection errors, timeouts, 5xx and 429 responses fail over to the next backend; other 4xx
+        responses are raised to the caller without counting against the backend.
+
+        open_stream(backend) must return an async generator of payloads for that backend.
+        """
+        candidates = iter(self.candidates(model))
+        pending = set()
+        last_error = None
+
+        def launch():
+            backend = next(candidates, None)
+            if backend is not None:
+                task = asyncio.create_task(self._first_token(backend, open_stream))
+                task.backend = backend
+                task.started = time.perf_counter()
+                pending.add(task)
+            return backend
+
+        def hedge_delay_for(backend):
+            return backend.ttft_percentile(self.hedge_percentile) if self.hedge and backend else None
+
+        primary = launch()
+        if primary is None:
+            raise aiohttp.ClientError(f"No backend serves model {model}")
+        hedge_delay = hedge_delay_for(primary)
+        hedged = False
+
+        winner = None
+        try:
+            while pending and winner is None:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge_delay = None
+                    hedged = True  # hedge at most once per request
+                    if launch():
+                        print(f"{primary.name} exceeded its p{self.hedge_percentile} time-to-first-token, hedging")
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    try:
+                        result = task.result()
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        if is_request_error(e):
+                            raise  # a bad request or rejected key is the caller's to handle, not a backend failure
+                        print(f"Backend {task.backend.name} failed: {e}")
+                        task.backend.record_failure()
+                        last_error = e
+                        continue
+                    if winner is None:
+                        winner = result
+                    else:
+                        await result[0].aclose()  # both answered at once, keep only one stream
+                if winner is None and not pending:
+                    # Fail over to the next candidate, which may still be hedged if we have not hedged yet
+                    primary = launch()
+                    hedge_delay = None if hedged else hedge_delay_for(primary)
+        finally:
+            for task in pending:
+                task.cancel()
+                if winner is not None:
+                    # A hedge loser took at least this long, which is still a useful latency sample
+                    task.backend.ttft_samples.append(time.perf_counter() - task.started)
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if winner is None:
+            raise last_error
+        stream, first = winner
+        if first is None:
+            return
+        try:
+            yield first
+            async for payload in stream:
+                yield payload
+        finally:
+            await stream.aclose()
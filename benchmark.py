@@ -0,0 +1,267 @@
+"""
+Microbenchmarks for the text-processing hot paths, run without a GUI or network.
+
+    python benchmark.py                   # time everything, write benchmark_results.json
+    python benchmark.py --save-baseline   # also keep the timings as the baseline for later runs
+    python benchmark.py --quick           # skip the largest inputs
+    python benchmark.py --only prompt     # run the benchmarks whose name contains "prompt"
+
+Every benchmark runs on synthetic inputs of growing size, so the results form a scaling curve.
+The run fails with exit code 1 when a timing is slower than the baseline by more than --tolerance,
+or when the growth between the two largest sizes is steeper than the benchmark's expected complexity.
+"""
+import argparse,json,math
+import platform,random,sys,timeit
+
+from backends import group_models_by_size
+from document import TextDocument, grammar_error_spans
+from markdown_viewer import render_markdown_html
+from prompt_builder import PromptAssembler
+from repetition import RepetitionDetector
+from retrieval import ContextRetriever
+from syntax_highlight import keyword_key, line_spans
+from tts_text import split_text, treat_text
+
+TEXT_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+# Python-Markdown converts well under 1 MB/s, 10M characters would dominate the whole run
+MARKDOWN_SIZES = [10_000, 100_000, 1_000_000]
+# Generations are a few thousand characters, the detector runs in pure Python per character
+STREAM_SIZES = [1_000, 10_000, 100_000]
+# Building the first index dominates setup time, indexing 10M characters takes seconds
+RETRIEVAL_SIZES = [10_000, 100_000, 1_000_000]
+LOREBOOK_SIZES = [100, 1_000, 10_000, 30_000]
+MODEL_COUNTS = [10, 100, 1_000, 10_000]
+# One grammar match per this many characters of checked text
+GRAMMAR_MATCH_SPACING = 200
+# Steepest acceptable growth for linear code; leaves room for cache and allocator effects on
+# large inputs while quadratic behaviour still shows up as an exponent close to 2
+LINEAR_GROWTH = 1.5
+# Below this, timings are too noisy and too dependent on what fits in the CPU caches to judge scaling
+MIN_SCALING_SECONDS = 0.005
+
+WORDS = ("the a an she he they it was were had said asked walked looked turned night door house road "
+         "river sword letter king queen village forest storm light shadow quiet slowly suddenly again "
+         "never always before after under over through between against toward").split()
+
+def synthetic_manuscript(size, seed=0):
+    """Deterministic prose of exactly size characters, in paragraphs of varying length."""
+    rng = random.Random(seed)
+    paragraphs = []
+    length = 0
+    while length < size:
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(4, 20))]
+            sentences.append(" ".join(words).capitalize() + rng.choice(".!?"))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 1
+    return "\n".join(paragraphs)[:size]
+
+def synthetic_markdown(size, seed=0):
+    rng = random.Random(seed)
+    prose = synthetic_manuscript(size, seed).split("\n")
+    blocks = []
+    for index, paragraph in enumerate(prose):
+        if index % 12 == 0:
+            blocks.append(f"## Chapter {index // 12 + 1}")
+        if index % 7 == 3:
+            blocks.append("\n".join(f"- *{rng.choice(WORDS)}* {rng.choice(WORDS)}" for _ in range(4)))
+        blocks.append(paragraph.replace(" the ", " **the** ", 1))
+    return "\n\n".join(blocks)[:size]
+
+def synthetic_lorebook(entries, seed=0):
+    rng = random.Random(seed)
+    prose = synthetic_manuscript(entries * 600 + 600, seed)
+    lorebook = {}
+    for index in range(entries):
+        start = rng.randrange(0, len(prose) - 600)
+        lorebook[f"Entry {index} {rng.choice(WORDS)}"] = prose[start:start + rng.randint(100, 600)]
+    return lorebook
+
+def synthetic_models(count, seed=0):
+    rng = random.Random(seed)
+    families = ["Llama-3", "Qwen2.5", "Mistral", "Mixtral", "Gemma-2", "Magnum", "Midnight-Miqu"]
+    models = []
+    for index in range(count):
+        size = rng.choice(["7B", "8B", "12B", "32B", "70B", "72B", "123B", "8x7B", "8x22B", ""])
+        models.append(f"{rng.choice(families)}-{size}-v{index}".replace("--", "-"))
+    return models
+
+def synthetic_grammar_results(text, seed=0):
+    """A LanguageTool-shaped response with one match every GRAMMAR_MATCH_SPACING characters."""
+    rng = random.Random(seed)
+    matches = []
+    for offset in range(0, len(text) - 10, GRAMMAR_MATCH_SPACING):
+        matches.append({
+            "offset": offset + rng.randint(0, 5),
+            "length": rng.randint(1, 10),
+            "message": "Possible spelling mistake found.",
+            "replacements": [{"value": rng.choice(WORDS)} for _ in range(3)],
+        })
+    return {"matches": matches}
+
+def bench_prepare_prompt(stable):
+    def setup(size):
+        assembler = PromptAssembler(stable=stable)
+        text = synthetic_manuscript(size)
+        lorebook = synthetic_lorebook(200)
+        memory = synthetic_manuscript(2_000, seed=1)
+        notes = "[Style: terse, ominous. Keep the focus on the queen.]"
+        return lambda: assembler.assemble(text, memory, notes, lorebook)
+    return setup
+
+def bench_prepare_prompt_lorebook(entries):
+    assembler = PromptAssembler()
+    text = synthetic_manuscript(100_000)
+    lorebook = synthetic_lorebook(entries)
+    return lambda: assembler.assemble(text, "", "", lorebook)
+
+def bench_group_models(count):
+    models = synthetic_models(count)
+    return lambda: group_models_by_size(models)
+
+def bench_grammar_spans(size):
+    document = TextDocument(synthetic_manuscript(size))
+    results = synthetic_grammar_results(document.text())
+    def run():
+        document.version += 1  # every check runs against a newly edited document
+        return grammar_error_spans(document, results)
+    return run
+
+def bench_retrieval_select(size):
+    document = TextDocument(synthetic_manuscript(size))
+    retriever = ContextRetriever(recent_chars=4_000)
+    retriever.sync(document, {})
+    prompt = document.text()
+    return lambda: retriever.select(prompt, {})
+
+def bench_retrieval_resync(size):
+    document = TextDocument(synthetic_manuscript(size))
+    retriever = ContextRetriever()
+    retriever.sync(document, {})
+    def run():
+        document.version += 1  # nothing changed, so only boundaries and hashes are recomputed
+        retriever.sync(document, {})
+    return run
+
+def bench_repetition_detector(size):
+    text = synthetic_manuscript(size)
+    chunks = [text[start:start + 4] for start in range(0, len(text), 4)]  # about one token per chunk
+    def run():
+        detector = RepetitionDetector()
+        for chunk in chunks:
+            detector.feed(chunk)
+    return run
+
+def bench_line_spans(size):
+    lines = synthetic_markdown(size).split("\n")
+    keywords = frozenset(keyword_key(name) for name in synthetic_lorebook(1_000))
+    max_words = max(key.count(" ") + 1 for key in keywords)
+    return lambda: [line_spans(line, keywords, max_words) for line in lines]
+
+def bench_treat_text(size):
+    text = synthetic_markdown(size)
+    return lambda: treat_text(text)
+
+def bench_split_text(size):
+    text = synthetic_manuscript(size)
+    return lambda: split_text(text)
+
+def bench_render_markdown(size):
+    text = synthetic_markdown(size)
+    render_markdown_html("warm up")  # extension loading is a one-time cost
+    return lambda: render_markdown_html(text)
+
+# name -> (setup(size) returning the callable to time, sizes, steepest acceptable growth exponent)
+BENCHMARKS = {
+    "prepare_prompt_classic": (bench_prepare_prompt(False), TEXT_SIZES, LINEAR_GROWTH),
+    "prepare_prompt_stable": (bench_prepare_prompt(True), TEXT_SIZES, LINEAR_GROWTH),
+    "prepare_prompt_lorebook_entries": (bench_prepare_prompt_lorebook, LOREBOOK_SIZES, LINEAR_GROWTH),
+    "group_models_by_size": (bench_group_models, MODEL_COUNTS, LINEAR_GROWTH),
+    "grammar_error_spans": (bench_grammar_spans, TEXT_SIZES, LINEAR_GROWTH),
+    "retrieval_select": (bench_retrieval_select, RETRIEVAL_SIZES, LINEAR_GROWTH),
+    "retrieval_resync": (bench_retrieval_resync, RETRIEVAL_SIZES, LINEAR_GROWTH),
+    "repetition_detector": (bench_repetition_detector, STREAM_SIZES, LINEAR_GROWTH),
+    "syntax_line_spans": (bench_line_spans, MARKDOWN_SIZES, LINEAR_GROWTH),
+    "treat_text": (bench_treat_text, TEXT_SIZES, LINEAR_GROWTH),
+    "split_text": (bench_split_text, TEXT_SIZES, LINEAR_GROWTH),
+    "render_markdown_html": (bench_render_markdown, MARKDOWN_SIZES, LINEAR_GROWTH),
+}
+
+def measure(func, repeat=3):
+    """Best per-call time over repeat rounds, each long enough to be measurable."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+def growth_exponent(size_a, seconds_a, size_b, seconds_b):
+    """Exponent k for which time grows like size**k between two points of the curve."""
+    return math.log(seconds_b / seconds_a) / math.log(size_b / size_a)
+
+def run(names, quick):
+    results = {}
+    for name in names:
+        setup, sizes, _ = BENCHMARKS[name]
+        if quick:
+            sizes = sizes[:-1]
+        results[name] = {}
+        previous = None
+        for size in sizes:
+            seconds = measure(setup(size))
+            results[name][str(size)] = seconds
+            growth = f"{growth_exponent(previous[0], previous[1], size, seconds):6.2f}" if previous else "     -"
+            print(f"{name:<34}{size:>12,}{seconds * 1000:>14.3f} ms   growth {growth}")
+            previous = (size, seconds)
+    return results
+
+def find_regressions(results, baseline, tolerance):
+    problems = []
+    for name, timings in results.items():
+        for size, seconds in timings.items():
+            reference = baseline.get(name, {}).get(size)
+            if reference and seconds > reference * (1 + tolerance):
+                problems.append(f"{name} at {size}: {seconds * 1000:.3f} ms, baseline {reference * 1000:.3f} ms")
+        sizes = sorted(timings, key=int)
+        if len(sizes) >= 2:
+            small, large = sizes[-2], sizes[-1]
+            if timings[small] >= MIN_SCALING_SECONDS:
+                exponent = growth_exponent(int(small), timings[small], int(large), timings[large])
+                if exponent > BENCHMARKS[name][2]:
+                    problems.append(f"{name} grows like n^{exponent:.2f} between {small} and {large}, "
+                                    f"expected at most n^{BENCHMARKS[name][2]}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the GUI-free text-processing hot paths.")
+    parser.add_argument("--only", help="run only benchmarks whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="skip the largest input size of every benchmark")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the timings")
+    parser.add_argument("--baseline", default="benchmark_baseline.json", help="timings to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed slowdown against the baseline as a fraction (default 0.5 = 50%%)")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.only or args.only in name]
+    print(f"Python {platform.python_version()} on {platform.platform()}")
+    results = run(names, args.quick)
+    with open(args.output, "w") as f:
+        json.dump({"python": platform.python_version(), "results": results}, f, indent=4)
+
+    try:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+    except FileNotFoundError:
+        baseline = {}
+    problems = find_regressions(results, baseline, args.tolerance)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "results": {**baseline, **results}}, f, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
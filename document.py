@@ -0,0 +1,189 @@
+import hashlib
+from bisect import bisect_right
+from itertools import accumulate
+
+class TextDocument:
+    """
+    In-memory mirror of the editor contents stored as an array of lines.
+
+    Tk addresses text as line.column, so edits map straight onto the line array without scanning the
+    document. Readers can take the tail, a line range, the length or a content hash without joining
+    the whole buffer into one string.
+
+    on_edit, when set, is called as on_edit(row, removed, added) after an edit replaced `removed`
+    lines starting at 0-based row with `added` lines, or with removed=None when all text was replaced.
+    """
+    def __init__(self, text=""):
+        self.on_edit = None
+        self.lines = [""]
+        self.length = 0
+        self.version = 0  # bumped on every edit, cheap change detection for savers and caches
+        self._hash = None
+        self._hash_version = -1
+        self._line_starts = None
+        self._starts_version = -1
+        self.set_text(text)
+
+    def set_text(self, text):
+        self.lines = text.split("\n")
+        self.length = len(text)
+        self.version += 1
+        if self.on_edit is not None:
+            self.on_edit(0, None, len(self.lines))
+
+    def clamp(self, line, column):
+        """Convert a 1-based Tk line and 0-based column into a valid 0-based (row, column)."""
+        row = line - 1
+        if row >= len(self.lines):
+            return len(self.lines) - 1, len(self.lines[-1])
+        row = max(row, 0)
+        return row, min(column, len(self.lines[row]))
+
+    def insert(self, line, column, text):
+        if not text:
+            return
+        row, column = self.clamp(line, column)
+        current = self.lines[row]
+        new_lines = text.split("\n")
+        new_lines[0] = current[:column] + new_lines[0]
+        new_lines[-1] += current[column:]
+        self.lines[row:row + 1] = new_lines
+        self.length += len(text)
+        self.version += 1
+        if self.on_edit is not None:
+            self.on_edit(row, 1, len(new_lines))
+
+    def delete(self, start_line, start_column, end_line, end_column):
+        start_row, start_column = self.clamp(start_line, start_column)
+        end_row, end_column = self.clamp(end_line, end_column)
+        if (end_row, end_column) <= (start_row, start_column):
+            return
+        removed = (
+            end_column - start_column if start_row == end_row else
+            len(self.lines[start_row]) - start_column + 1
+            + sum(len(self.lines[row]) + 1 for row in range(start_row + 1, end_row))
+            + end_column
+        )
+        self.lines[start_row:end_row + 1] = [self.lines[start_row][:start_column] + self.lines[end_row][end_column:]]
+        self.length -= removed
+        self.version += 1
+        if self.on_edit is not None:
+            self.on_edit(start_row, end_row - start_row + 1, 1)
+
+    def text(self):
+        return "\n".join(self.lines)
+
+    def line_range(self, first_row, last_row):
+        """Text of 0-based rows first_row..last_row inclusive."""
+        return "\n".join(self.lines[first_row:last_row + 1])
+
+    def tail(self, count):
+        """The last count characters, built only from the lines that contribute to them."""
+        if count <= 0:
+            return ""
+        parts = []
+        remaining = count
+        for row in range(len(self.lines) - 1, -1, -1):
+            line = self.lines[row]
+            if row < len(self.lines) - 1:
+                line += "\n"
+            if len(line) >= remaining:
+                parts.append(line[len(line) - remaining:])
+                break
+            parts.append(line)
+            remaining -= len(line)
+        return "".join(reversed(parts))
+
+    def line_starts(self):
+        """Character offset of the start of every line, rebuilt at most once per version."""
+        if self._starts_version != self.version:
+            self._line_starts = [0, *accumulate(len(line) + 1 for line in self.lines[:-1])]
+            self._starts_version = self.version
+        return self._line_starts
+
+    def index_at(self, offset):
+        """Tk 'line.column' index of a character offset, the same position as '1.0 + offset chars'."""
+        offset = max(0, min(offset, self.length))
+        starts = self.line_starts()
+        row = bisect_right(starts, offset) - 1
+        return f"{row + 1}.{offset - starts[row]}"
+
+    def offset_at(self, index):
+        """Character offset of a Tk 'line.column' index, the inverse of index_at."""
+        line, column = map(int, index.split("."))
+        row, column = self.clamp(line, column)
+        return self.line_starts()[row] + column
+
+    def content_hash(self):
+        """MD5 of the document, recomputed at most once per version and without joining the lines."""
+        if self._hash_version != self.version:
+            digest = hashlib.md5()
+            for row, line in enumerate(self.lines):
+                if row:
+                    digest.update(b"\n")
+                digest.update(line.encode())
+            self._hash = digest.hexdigest()
+            self._hash_version = self.version
+        return self._hash
+
+def grammar_error_spans(document, results, offset=0):
+    """
+    Convert LanguageTool matches into (start index, end index, message, replacements) tuples.
+
+    offset is where the checked text starts in the document, since only its tail is sent.
+    """
+    return [
+        (document.index_at(match['offset'] + offset),
+         document.index_at(match['offset'] + match['length'] + offset),
+         match['message'], match['replacements'])
+        for match in results.get('matches', [])
+    ]
+
+class TextWidgetMirror:
+    """
+    Keeps a TextDocument in sync with a Tk Text widget.
+
+    The widget's Tcl command is renamed and replaced by a proxy, so every insert, delete and replace
+    (typing, pasting, the stream inserter, grammar fixes) is applied to the document as it happens.
+    Undo and redo change the widget internally, so the document is resynced after them.
+    """
+    def __init__(self, widget):
+        self.widget = widget
+        self.document = TextDocument(widget.get("1.0", "end-1c"))
+        self._original = widget._w + "_mirrored"
+        widget.tk.call("rename", widget._w, self._original)
+        widget.tk.createcommand(widget._w, self._proxy)
+
+    def _call(self, *args):
+        return self.widget.tk.call(self._original, *args)
+
+    def _position(self, index):
+        line, column = self._call("index", index).split(".")
+        return int(line), int(column)
+
+    def _proxy(self, command, *args):
+        if command == "insert" and len(args) >= 2:
+            position = self._position(args[0])
+            result = self._call(command, *args)
+            self.document.insert(*position, "".join(args[1::2]))
+            return result
+        if command == "delete" and 1 <= len(args) <= 2:
+            start = self._position(args[0])
+            end = self._position(args[1]) if len(args) == 2 else self._position(f"{args[0]} + 1 chars")
+            result = self._call(command, *args)
+            self.document.delete(*start, *end)
+            return result
+        if command == "replace" and len(args) >= 3:
+            start = self._position(args[0])
+            end = self._position(args[1])
+            result = self._call(command, *args)
+            self.document.delete(*start, *end)
+            self.document.insert(*start, "".join(args[2::2]))
+            return result
+        result = self._call(command, *args)
+        if command in ("delete", "replace", "insert") or (command == "edit" and args and args[0] in ("undo", "redo")):
+            self.resync()  # forms the incremental path does not cover
+        return result
+
+    def resync(self):
+        self.document.set_text(self._call("get", "1.0", "end-1c"))
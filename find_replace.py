@@ -0,0 +1,256 @@
+import asyncio,re
+from bisect import bisect_left
+import tkinter as tk
+
+from service_loop import PRIORITY_INTERACTIVE
+
+MAX_MATCHES = 100_000
+HIGHLIGHT_BATCH = 500  # tag ranges added per main-loop callback
+
+def compile_pattern(query, regex=False, match_case=False):
+    flags = re.MULTILINE if regex else 0
+    if not match_case:
+        flags |= re.IGNORECASE
+    return re.compile(query if regex else re.escape(query), flags)
+
+def find_matches(text, pattern, replacement=None, regex=False, limit=MAX_MATCHES):
+    """
+    (start, end, replaced text) offsets of the non-empty matches of pattern in text, at most limit.
+
+    With regex, replacement may refer to groups (\\1, \\g<name>); otherwise it is inserted as is.
+    """
+    if replacement is not None and not regex:
+        replacement = replacement.replace("\\", "\\\\")
+    matches = []
+    for match in pattern.finditer(text):
+        if match.end() == match.start():
+            continue
+        matches.append((match.start(), match.end(), match.expand(replacement) if replacement is not None else None))
+        if len(matches) >= limit:
+            break
+    return matches
+
+def replace_matches(text, matches):
+    """(start, end, replacement) of the smallest range of text covering matches, with every match replaced."""
+    first, last = matches[0][0], matches[-1][1]
+    parts = []
+    position = first
+    for start, end, replaced in matches:
+        parts += (text[position:start], replaced)
+        position = end
+    return first, last, "".join(parts)
+
+class FindReplaceDialog:
+    """
+    Find and replace over the selected story without blocking the editor.
+
+    Searches run on a snapshot of the document in a worker thread, so a slow pattern over a long
+    story never freezes typing. Matches are tagged in batches through after(), the visible part of
+    the editor first, and batches of an outdated search are dropped. Replace All builds the new text
+    of the range spanning all matches in the worker thread too and applies it as one edit: a single
+    widget replace, undo step and session save.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.tab = None  # tab the matches belong to
+        self.version = None  # document version the matches belong to
+        self.options = None  # (query, replacement, regex, match case) of the matches
+        self.matches = []
+        self.search_id = 0
+        self.job = None
+        self.pending = None  # after() id of the next highlight batch
+
+        self.popup = tk.Toplevel(app.root)
+        self.popup.title("Find and Replace")
+        self.popup.protocol("WM_DELETE_WINDOW", self.close)
+
+        fields = tk.Frame(self.popup)
+        fields.pack(fill='x', padx=10, pady=5)
+        tk.Label(fields, text="Find:").grid(row=0, column=0, sticky='w')
+        self.find_var = tk.StringVar()
+        find_entry = tk.Entry(fields, textvariable=self.find_var, width=40)
+        find_entry.grid(row=0, column=1, sticky='we', pady=2)
+        find_entry.bind("<Return>", lambda event: self.find_next())
+        tk.Label(fields, text="Replace:").grid(row=1, column=0, sticky='w')
+        self.replace_var = tk.StringVar()
+        tk.Entry(fields, textvariable=self.replace_var, width=40).grid(row=1, column=1, sticky='we', pady=2)
+        fields.columnconfigure(1, weight=1)
+
+        self.regex_var = tk.BooleanVar(value=False)
+        self.case_var = tk.BooleanVar(value=False)
+        options = tk.Frame(self.popup)
+        options.pack(fill='x', padx=10)
+        tk.Checkbutton(options, text="Regular expression", variable=self.regex_var).pack(side='left')
+        tk.Checkbutton(options, text="Match case", variable=self.case_var).pack(side='left')
+
+        buttons = tk.Frame(self.popup)
+        buttons.pack(fill='x', padx=10, pady=5)
+        tk.Button(buttons, text="Find All", command=self.find_all).pack(side='left')
+        tk.Button(buttons, text="Next", command=self.find_next).pack(side='left', padx=5)
+        tk.Button(buttons, text="Replace", command=self.replace).pack(side='left')
+        tk.Button(buttons, text="Replace All", command=self.replace_all).pack(side='left', padx=5)
+
+        self.status_label = tk.Label(self.popup, text="", anchor='w')
+        self.status_label.pack(fill='x', padx=10, pady=(0, 5))
+        find_entry.focus_set()
+
+    def current_options(self):
+        return self.find_var.get(), self.replace_var.get(), self.regex_var.get(), self.case_var.get()
+
+    def fresh(self):
+        """Whether the matches still describe the selected tab, its text and the dialog's options."""
+        tab = self.app.tab
+        return (self.tab is tab and not tab.closed and self.version == tab.document.version
+                and self.options == self.current_options())
+
+    def search(self, then=None):
+        """Scan a snapshot of the selected story in the background, then highlight and call then()."""
+        query, replacement, regex, match_case = options = self.current_options()
+        if not query:
+            return
+        try:
+            pattern = compile_pattern(query, regex, match_case)
+        except re.error as e:
+            self.status_label.config(text=f"Invalid pattern: {e}")
+            return
+        self.clear_highlights()
+        tab = self.app.tab
+        tab.autocomplete.clear()  # ghost text is not part of the story
+        text = tab.document.text()
+        version = tab.document.version
+        self.search_id += 1
+        search_id = self.search_id
+        if self.job is not None:
+            self.job.cancel()
+        self.status_label.config(text="Searching...")
+        self.job = self.app.service.submit(
+            lambda session: asyncio.to_thread(find_matches, text, pattern, replacement, regex), PRIORITY_INTERACTIVE,
+            on_result=lambda matches: self.on_matches(search_id, tab, version, options, matches, then),
+            on_error=lambda e: self.status_label.config(text=f"Search failed: {e}"))
+
+    def on_matches(self, search_id, tab, version, options, matches, then):
+        if search_id != self.search_id or tab.closed or not self.popup.winfo_exists():
+            return
+        if tab.document.version != version:
+            self.search(then)  # edited while scanning
+            return
+        self.tab, self.version, self.options, self.matches = tab, version, options, matches
+        limited = " (limit reached)" if len(matches) >= MAX_MATCHES else ""
+        self.status_label.config(text=f"{len(matches)} matches{limited}")
+        self.highlight(search_id)
+        if then is not None:
+            then()
+
+    def highlight(self, search_id):
+        """Tag the matches in batches, starting with the ones in view."""
+        widget = self.tab.text_widget
+        document = self.tab.document
+        widget.tag_config('find_match', background='orange')
+        first = document.offset_at(widget.index("@0,0"))
+        last = document.offset_at(widget.index(f"@0,{widget.winfo_height()}"))
+        starts = [start for start, _, _ in self.matches]
+        low, high = bisect_left(starts, first), bisect_left(starts, last + 1)
+        order = self.matches[low:high] + self.matches[high:] + self.matches[:low]
+        self.highlight_batch(search_id, order, 0)
+
+    def highlight_batch(self, search_id, order, position):
+        self.pending = None
+        if search_id != self.search_id or not self.fresh():
+            return
+        document = self.tab.document
+        ranges = []
+        for start, end, _ in order[position:position + HIGHLIGHT_BATCH]:
+            ranges += (document.index_at(start), document.index_at(end))
+        if ranges:
+            self.tab.text_widget.tag_add('find_match', *ranges)
+        if position + HIGHLIGHT_BATCH < len(order):
+            self.pending = self.app.root.after(1, self.highlight_batch, search_id, order, position + HIGHLIGHT_BATCH)
+
+    def clear_highlights(self):
+        if self.pending is not None:
+            self.app.root.after_cancel(self.pending)
+            self.pending = None
+        if self.tab is not None and not self.tab.closed:
+            self.tab.text_widget.tag_remove('find_match', '1.0', tk.END)
+
+    def find_all(self):
+        self.search()
+
+    def find_next(self):
+        """Select the first match after the cursor, wrapping around at the end of the story."""
+        if not self.fresh():
+            self.search(then=self.find_next)
+            return
+        if not self.matches:
+            return
+        widget = self.tab.text_widget
+        document = self.tab.document
+        cursor = document.offset_at(widget.index(tk.INSERT))
+        starts = [start for start, _, _ in self.matches]
+        index = bisect_left(starts, cursor)
+        start, end, _ = self.matches[index % len(self.matches)]
+        widget.tag_remove(tk.SEL, '1.0', tk.END)
+        widget.tag_add(tk.SEL, document.index_at(start), document.index_at(end))
+        widget.mark_set(tk.INSERT, document.index_at(end))
+        widget.see(tk.INSERT)
+        self.status_label.config(text=f"Match {index % len(self.matches) + 1} of {len(self.matches)}")
+
+    def replace(self):
+        """Replace the selected match, then move on to the next one."""
+        if not self.fresh():
+            self.search(then=self.replace)
+            return
+        widget = self.tab.text_widget
+        document = self.tab.document
+        selection = widget.tag_ranges(tk.SEL)
+        if selection:
+            selected = (document.offset_at(str(selection[0])), document.offset_at(str(selection[1])))
+            for start, end, replaced in self.matches:
+                if (start, end) == selected:
+                    widget.replace(document.index_at(start), document.index_at(end), replaced)
+                    break
+        self.find_next()
+
+    def replace_all(self):
+        if not self.fresh():
+            self.search(then=self.replace_all)
+            return
+        if not self.matches:
+            return
+        tab = self.tab
+        tab.autocomplete.clear()
+        text = tab.document.text()
+        version = tab.document.version
+        matches = self.matches
+        self.search_id += 1
+        search_id = self.search_id
+        self.status_label.config(text="Replacing...")
+        self.job = self.app.service.submit(
+            lambda session: asyncio.to_thread(replace_matches, text, matches), PRIORITY_INTERACTIVE,
+            on_result=lambda edit: self.apply_replacement(search_id, tab, version, len(matches), edit),
+            on_error=lambda e: self.status_label.config(text=f"Replace failed: {e}"))
+
+    def apply_replacement(self, search_id, tab, version, count, edit):
+        if search_id != self.search_id or tab.closed or not self.popup.winfo_exists():
+            return
+        if tab.document.version != version:
+            self.search(then=self.replace_all)  # edited while the replacement was built
+            return
+        start, end, replacement = edit
+        document = tab.document
+        widget = tab.text_widget
+        self.clear_highlights()
+        widget.edit_separator()
+        widget.replace(document.index_at(start), document.index_at(end), replacement)
+        widget.edit_separator()
+        self.matches = []
+        self.status_label.config(text=f"Replaced {count} matches")
+        self.app.save_session(tab)
+
+    def close(self):
+        self.search_id += 1
+        if self.job is not None:
+            self.job.cancel()
+        self.clear_highlights()
+        self.popup.destroy()
+        self.app.find_dialog = None
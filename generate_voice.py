@@ -1,6 +1,11 @@
 import asyncio,threading
-import json,re
+import json
+import aiohttp
 import pygame
+from backends import load_backends
+from tts_text import split_text, treat_text
+from rate_limiter import limiter_for, send_limited
+from service_loop import PRIORITY_BACKGROUND
 
 # Initialize Pygame mixer
 pygame.mixer.init()
@@ -15,20 +20,23 @@ USE_NAI_TTS = True
 with open("config.json", "r") as f:
     config = json.load(f)
     jwt = config.get("NOVELAI_API_KEY")
-    # if jwt is "", then try new infermatic tts endpoint instead: https://api.totalgpt.ai/audio/speech
+    # if jwt is "", then use the OpenAI-compatible speech endpoint of the first backend flagged with "tts"
     if not jwt:  # truthy check that returns False to anything but non-empty strings
         USE_NAI_TTS = False
-        jwt = config.get("INFERMATIC_API_KEY")  # main.py handles if this one is empty, here we assume it is set
-        print("Using Infermatic TTS with the configured API key.")
-        import requests
+        backends = load_backends(config)
+        tts_backend = next((backend for backend in backends if backend.tts), backends[0])
+        jwt = tts_backend.api_key  # main.py handles if this one is empty, here we assume it is set
+        tts_limiter = tts_backend.limiter  # shared with completions and model fetches on the same key
+        print(f"Using {tts_backend.name} TTS with the configured API key.")
     else:
         print("Using NovelAI TTS with the configured API key.")
         from novelai_python import VoiceGenerate,JwtCredential,APIError
         from novelai_python.sdk.ai.generate_voice import VoiceSpeakerV2,VoiceSpeakerV1
         from novelai_python.utils.useful import enum_to_list
         from pydantic import SecretStr
+        tts_limiter = limiter_for(("novelai", jwt), "NovelAI")
 
-async def generate_voice_async(text: str):
+async def generate_voice_async(session, text: str):
     if USE_NAI_TTS:
         credential = JwtCredential(jwt_token=SecretStr(jwt))
         try:
@@ -36,9 +44,10 @@ async def generate_voice_async(text: str):
                 text=text,
                 voice_engine=VoiceSpeakerV1.Crina,
             )
-            result = await voice_gen.request(
-                session=credential
-            )
+            async with tts_limiter.slot(PRIORITY_BACKGROUND):
+                result = await voice_gen.request(
+                    session=credential
+                )
         except APIError as e:
             print(f"Error: {e.message}")
             return None
@@ -48,7 +57,7 @@ async def generate_voice_async(text: str):
                 f.write(file)
             return "generate_voice.mp3"
     else:
-        url = "https://api.totalgpt.ai/v1/audio/speech"
+        url = f"{tts_backend.base_url}/v1/audio/speech"
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {jwt}"
@@ -60,35 +69,22 @@ async def generate_voice_async(text: str):
             "response_format": "mp3",
             "speed": 1.0
         }
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-            with open("generate_voice.mp3", "wb") as f:
-                f.write(response.content)
-            return "generate_voice.mp3"
-        else:
-            print(f"Error during Infermatic TTS request: {response.status_code} - {response.text}")
+        try:
+            content = await send_limited(session, tts_limiter, PRIORITY_BACKGROUND, "POST", url,
+                                         lambda response: response.read(), headers=headers, json=data)
+        except aiohttp.ClientError as e:
+            print(f"Error during TTS request: {e}")
             return None
+        with open("generate_voice.mp3", "wb") as f:
+            f.write(content)
+        return "generate_voice.mp3"
 
-def treat_text(text: str) -> str:
-    """
-    Removes all asterisks ('*') and hashes ('#') from the input text.
-    """
-    treated_text = re.sub(r'\*', '', text)
-    treated_text = re.sub(r'\#', '', treated_text)
-    return treated_text
-
-def split_text(text: str, max_length: int = 1000) -> list:
-    """
-    Splits the text into chunks of a specified maximum length.
-    """
-    return [text[i:i + max_length] for i in range(0, len(text), max_length)]
-
-async def generate_and_play_voice(text: str):
+async def generate_and_play_voice(session, text: str):
     chunks = split_text(treat_text(text))
     for chunk in chunks:
         if not audio_playback_active.is_set():
             break
-        audio_file = await generate_voice_async(chunk)
+        audio_file = await generate_voice_async(session, chunk)
         if audio_file:
             sound = pygame.mixer.Sound(audio_file)
             sound.play()
@@ -96,11 +92,17 @@ async def generate_and_play_voice(text: str):
                 await asyncio.sleep(0.1)
             sound.stop()
 
-def generate_voice(text: str):
+async def play_voice(session, text: str):
+    """Generate and play speech for text on the caller's event loop, sharing its HTTP session."""
     audio_playback_active.set()  # Set the flag when playback starts
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(generate_and_play_voice(text))
+    await generate_and_play_voice(session, text)
+
+def generate_voice(text: str):
+    """Blocking helper for standalone use; the app schedules play_voice on its service loop instead."""
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            await play_voice(session, text)
+    asyncio.run(run())
 
 def stop_audio():
     audio_playback_active.clear()
@@ -0,0 +1,133 @@
+import os,json,time
+import queue,threading,traceback
+
+JOURNAL_DIR = "journal"
+# Seconds without new records after which buffered records are synced anyway
+IDLE_SYNC_INTERVAL = 1.0
+
+def journal_path(story_id):
+    return os.path.join(JOURNAL_DIR, f"story_{story_id}.jsonl")
+
+class JournalWriter:
+    """
+    One daemon thread that performs the file I/O of every journal, in the order it was requested.
+
+    Streaming code only enqueues records, so writes and fsyncs never block the service loop.
+    Journals with unsynced records are synced once the queue has been idle for IDLE_SYNC_INTERVAL.
+    """
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.dirty = set()  # journals with records written since their last sync, touched by the thread only
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, action, *args):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="journal-writer", daemon=True)
+                self.thread.start()
+        self.queue.put((action, args))
+
+    def run(self):
+        while True:
+            try:
+                action, args = self.queue.get(timeout=IDLE_SYNC_INTERVAL)
+            except queue.Empty:
+                for journal in list(self.dirty):
+                    journal.sync()
+                continue
+            try:
+                action(*args)
+            except Exception:
+                traceback.print_exc()
+
+writer = JournalWriter()
+
+class GenerationJournal:
+    """
+    Append-only record of one in-flight generation, so a crash does not lose what already streamed.
+
+    The first line is a header describing the story text the generation continues; every further
+    line is a streamed chunk, or the length the text was cut back to. Records are written by the
+    journal writer thread, buffered and flushed with fsync at most every fsync_interval seconds (and
+    when the stream goes quiet), so a crash loses at most that much output. The file is deleted once
+    the generation ended and its text is saved with the story.
+    """
+    def __init__(self, path, header, fsync_interval=1.0):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "w", encoding="utf-8")
+        self.last_sync = 0.0
+        self.failed = False  # a full disk must not stop the generation itself
+        writer.submit(self.write, header)
+
+    def write(self, record):
+        """Runs on the writer thread."""
+        if self.failed:
+            return
+        try:
+            self.file.write(json.dumps(record) + "\n")
+            writer.dirty.add(self)
+            if time.monotonic() - self.last_sync >= self.fsync_interval:
+                self.sync()
+        except OSError as e:
+            print(f"Generation journal disabled: {e}")
+            self.failed = True
+
+    def append(self, chunk):
+        writer.submit(self.write, {"text": chunk})
+
+    def truncate(self, keep):
+        writer.submit(self.write, {"keep": keep})
+
+    def sync(self):
+        """Runs on the writer thread."""
+        writer.dirty.discard(self)
+        if self.failed or self.file.closed:
+            return
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError as e:
+            print(f"Generation journal disabled: {e}")
+            self.failed = True
+        self.last_sync = time.monotonic()
+
+    def discard(self):
+        writer.submit(self._discard)
+
+    def _discard(self):
+        writer.dirty.discard(self)
+        try:
+            self.file.close()
+            os.remove(self.path)
+        except OSError:
+            pass  # already gone, or unwritable; a stale journal is dropped on the next start
+
+def read_journal(path):
+    """
+    Return (header, generated text) of a journal left behind, or None if there is none.
+
+    A torn last line from a crash during a write is ignored.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+    except FileNotFoundError:
+        return None
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            break
+    if not records or not isinstance(records[0], dict) or "base_hash" not in records[0]:
+        return None
+    parts = []
+    for record in records[1:]:
+        if "text" in record:
+            parts.append(record["text"])
+        elif "keep" in record:
+            parts = ["".join(parts)[:record["keep"]]]
+    return records[0], "".join(parts)
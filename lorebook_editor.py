@@ -0,0 +1,168 @@
+import tkinter as tk
+from tkinter import scrolledtext
+
+class LorebookEditor:
+    """
+    Master-detail lorebook editor: a searchable list of entry names and a single editor pane.
+
+    Only the selected entry is loaded into editor widgets, so opening the editor costs the same for
+    ten entries or ten thousand. Edits are tracked per entry and written back with apply_to().
+    """
+    def __init__(self, master, entries):
+        self.entries = [[name, content] for name, content in entries.items()]
+        self.changed = set()  # indexes of entries edited since the editor opened
+        self.structure_changed = False  # entries added, deleted or renamed
+        self.current = None  # index of the entry shown in the editor pane
+        self.visible = []  # entry index for each listbox row
+
+        self.frame = tk.Frame(master)
+        self.frame.pack(fill='both', expand=True, padx=10, pady=5)
+
+        index_frame = tk.Frame(self.frame)
+        index_frame.pack(side='left', fill='y')
+
+        tk.Label(index_frame, text="Search:").pack(anchor='w')
+        self.search_var = tk.StringVar()
+        search_entry = tk.Entry(index_frame, textvariable=self.search_var)
+        search_entry.pack(fill='x')
+        search_entry.bind("<KeyRelease>", self.refresh_index)
+
+        list_frame = tk.Frame(index_frame)
+        list_frame.pack(fill='both', expand=True, pady=5)
+        self.index_list = tk.Listbox(list_frame, width=25, exportselection=False)
+        self.index_list.pack(side='left', fill='both', expand=True)
+        scrollbar = tk.Scrollbar(list_frame, orient='vertical', command=self.index_list.yview)
+        scrollbar.pack(side='right', fill='y')
+        self.index_list.configure(yscrollcommand=scrollbar.set)
+        self.index_list.bind("<<ListboxSelect>>", self.on_select)
+
+        tk.Button(index_frame, text="New Entry", command=self.add_entry).pack(side='left', pady=5)
+        tk.Button(index_frame, text="Delete Entry", command=self.delete_entry).pack(side='left', padx=5, pady=5)
+
+        editor_frame = tk.Frame(self.frame)
+        editor_frame.pack(side='left', fill='both', expand=True, padx=(10, 0))
+
+        tk.Label(editor_frame, text="Name:").pack(anchor='w')
+        self.name_entry = scrolledtext.ScrolledText(editor_frame, wrap='word', width=50, height=2)
+        self.name_entry.pack(fill='x', pady=5)
+
+        tk.Label(editor_frame, text="Content:").pack(anchor='w')
+        self.content_entry = scrolledtext.ScrolledText(editor_frame, wrap='word', width=50, height=10)
+        self.content_entry.pack(fill='both', expand=True, pady=5)
+
+        self.refresh_index()
+        if self.entries:
+            self.select(0)
+        else:
+            self.set_editor_state(tk.DISABLED)
+
+    def label(self, idx):
+        name = self.entries[idx][0]
+        return f"#{idx + 1} {name or '(unnamed)'}"
+
+    def refresh_index(self, event=None):
+        query = self.search_var.get().strip().lower()
+        self.visible = [
+            idx for idx, (name, content) in enumerate(self.entries)
+            if not query or query in name.lower() or query in content.lower()
+        ]
+        self.index_list.delete(0, tk.END)
+        self.index_list.insert(tk.END, *(self.label(idx) for idx in self.visible))
+        if self.current in self.visible:
+            row = self.visible.index(self.current)
+            self.index_list.selection_set(row)
+            self.index_list.see(row)
+
+    def on_select(self, event=None):
+        selection = self.index_list.curselection()
+        if selection:
+            self.select(self.visible[selection[0]])
+
+    def select(self, idx):
+        if idx == self.current:
+            return
+        self.store_current()
+        self.current = idx
+        self.set_editor_state(tk.NORMAL)
+        name, content = self.entries[idx]
+        for widget, value in ((self.name_entry, name), (self.content_entry, content)):
+            widget.delete("1.0", tk.END)
+            widget.insert(tk.END, value)
+            widget.edit_modified(False)
+        if idx in self.visible:
+            row = self.visible.index(idx)
+            self.index_list.selection_clear(0, tk.END)
+            self.index_list.selection_set(row)
+            self.index_list.see(row)
+
+    def set_editor_state(self, state):
+        if state == tk.DISABLED:
+            for widget in (self.name_entry, self.content_entry):
+                widget.delete("1.0", tk.END)
+        self.name_entry.config(state=state)
+        self.content_entry.config(state=state)
+
+    def store_current(self):
+        """Copy the editor pane back into the entry list, but only if the user actually edited it."""
+        if self.current is None:
+            return
+        if not (self.name_entry.edit_modified() or self.content_entry.edit_modified()):
+            return
+        name = self.name_entry.get("1.0", tk.END).strip()
+        content = self.content_entry.get("1.0", tk.END).strip()
+        old_name, old_content = self.entries[self.current]
+        if (name, content) != (old_name, old_content):
+            self.entries[self.current] = [name, content]
+            self.changed.add(self.current)
+            if name != old_name:
+                self.structure_changed = True
+                if self.current in self.visible:
+                    row = self.visible.index(self.current)
+                    self.index_list.delete(row)
+                    self.index_list.insert(row, self.label(self.current))
+        self.name_entry.edit_modified(False)
+        self.content_entry.edit_modified(False)
+
+    def add_entry(self):
+        self.store_current()
+        self.entries.append(["", ""])
+        self.structure_changed = True
+        self.search_var.set("")
+        self.refresh_index()
+        self.select(len(self.entries) - 1)
+        self.name_entry.focus_set()
+
+    def delete_entry(self):
+        if self.current is None:
+            return
+        del self.entries[self.current]
+        self.changed = {idx - (idx > self.current) for idx in self.changed if idx != self.current}
+        self.structure_changed = True
+        self.current = None
+        self.refresh_index()
+        if self.entries:
+            self.select(self.visible[0] if self.visible else 0)
+        else:
+            self.set_editor_state(tk.DISABLED)
+
+    def apply_to(self, lorebook_entries):
+        """
+        Write edits into the lorebook dict in place and return the names of the entries touched.
+
+        Entries missing a name or content are dropped, as before. Without adds, deletes or renames
+        only the edited entries are written; otherwise the dict is rebuilt and None is returned.
+        """
+        self.store_current()
+        if self.structure_changed:
+            lorebook_entries.clear()
+            lorebook_entries.update((name, content) for name, content in self.entries if name and content)
+            return None
+        names = set()
+        for idx in self.changed:
+            name, content = self.entries[idx]
+            if content:
+                lorebook_entries[name] = content
+            else:
+                lorebook_entries.pop(name, None)
+            names.add(name)
+        return names
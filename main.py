@@ -1,18 +1,89 @@
-import os,json,hashlib
-import threading,asyncio
+import os,json,hashlib,time
+import asyncio
+from contextlib import aclosing
 import tkinter as tk
 from tkinter import ttk, scrolledtext, simpledialog, messagebox
-import requests,sseclient
-import re
+import aiohttp
+import sqlite3
 
 # Import the new markdown_viewer module
 from markdown_viewer import show_markdown_viewer
+from service_loop import ServiceLoop, TkBridge, PRIORITY_INTERACTIVE, PRIORITY_DEFAULT, PRIORITY_BACKGROUND
+from story_store import StoryStore
+from lorebook_editor import LorebookEditor
+from find_replace import FindReplaceDialog
+from syntax_highlight import SyntaxHighlighter
+from model_prober import ModelProber, rank_models_by_speed
+from generation_journal import GenerationJournal, journal_path, read_journal
+from prompt_builder import CHARS_PER_TOKEN, PromptAssembler
+from backends import BackendRouter, group_models_by_size, load_backends
+from document import TextWidgetMirror, grammar_error_spans
+from autocomplete import GhostCompleter
+from token_logprobs import TokenLogprobs
+from summarizer import RollingSummarizer
+from retrieval import ContextRetriever
+from repetition import RepetitionDetector
+import profiling
+from profiling import LagMonitor, ProfileSession, timed
+from rate_limiter import RATE_LIMIT_RETRIES, all_limiters, limiter_for, retry_after_seconds, send_limited
 
 with open("config.json", "r") as f:
     config = json.load(f)
 
 if config['USE_TTS']:
-    from generate_voice import generate_voice, stop_audio
+    from generate_voice import play_voice, stop_audio
+
+# Seconds without a new token before an in-flight stream is considered stalled
+STALL_TIMEOUT = config.get('STALL_TIMEOUT', 30)
+# How many times a stalled stream is resumed before giving up
+STALL_RETRIES = config.get('STALL_RETRIES', 1)
+CONNECT_TIMEOUT = 10
+# Keep a byte-stable prompt prefix across requests so servers with prefix caching can skip prefill
+PREFIX_STABLE_PROMPT = config.get('PREFIX_STABLE_PROMPT', False)
+# Race a second backend when the first is slower than this percentile of its own time-to-first-token
+HEDGE_REQUESTS = config.get('HEDGE_REQUESTS', False)
+HEDGE_PERCENTILE = config.get('HEDGE_PERCENTILE', 90)
+# Seconds between background health checks of the configured backends
+HEALTH_CHECK_INTERVAL = config.get('HEALTH_CHECK_INTERVAL', 300)
+# Periodically time tiny completions to find the currently fast models
+MODEL_PROBING = config.get('MODEL_PROBING', False)
+PROBE_INTERVAL = config.get('PROBE_INTERVAL', 600)
+PROBE_MODELS_PER_ROUND = config.get('PROBE_MODELS_PER_ROUND', 2)
+SORT_MODELS_BY_SPEED = config.get('SORT_MODELS_BY_SPEED', False)
+# LanguageTool's free API allows 20 requests per minute
+GRAMMAR_LIMITER = limiter_for("https://api.languagetool.org", "LanguageTool", requests_per_minute=20, max_concurrency=1)
+# Inline ghost-text suggestions after a pause in typing
+AUTOCOMPLETE = config.get('AUTOCOMPLETE', False)
+AUTOCOMPLETE_DELAY_MS = config.get('AUTOCOMPLETE_DELAY_MS', 400)
+AUTOCOMPLETE_MAX_TOKENS = config.get('AUTOCOMPLETE_MAX_TOKENS', 16)
+# Request this many alternatives per generated token; Ctrl+click a generated word to swap it (0 disables)
+LOGPROBS = config.get('LOGPROBS', 0)
+# Summarize older story text in the background and send summaries instead of the full text
+ROLLING_SUMMARY = config.get('ROLLING_SUMMARY', False)
+SUMMARY_MODEL = config.get('SUMMARY_MODEL', "")  # empty uses the selected model
+SUMMARY_RECENT_CHARS = config.get('SUMMARY_RECENT_CHARS', 12000)
+SUMMARY_CHUNK_CHARS = config.get('SUMMARY_CHUNK_CHARS', 6000)
+SUMMARY_MAX_CHUNKS = config.get('SUMMARY_MAX_CHUNKS', 20)  # chunks summarized per background job
+# Inject story passages and lorebook entries relevant to the recent text
+RETRIEVAL = config.get('RETRIEVAL', False)
+RETRIEVAL_TOP_K = config.get('RETRIEVAL_TOP_K', 5)
+RETRIEVAL_MAX_TOKENS = config.get('RETRIEVAL_MAX_TOKENS', 400)
+RETRIEVAL_RECENT_CHARS = config.get('RETRIEVAL_RECENT_CHARS', 0)  # 0 sends the whole story
+RETRIEVAL_LOREBOOK = config.get('RETRIEVAL_LOREBOOK', False)
+# Stop generations that fall into repetition loops and remove the repeated tail
+REPETITION_DETECTION = config.get('REPETITION_DETECTION', False)
+REPETITION_RETRIES = config.get('REPETITION_RETRIES', 0)
+REPETITION_PENALTY_STEP = config.get('REPETITION_PENALTY_STEP', 0.1)
+# Colour dialogue, Markdown and lorebook entry names in the editor
+SYNTAX_HIGHLIGHT = config.get('SYNTAX_HIGHLIGHT', False)
+# Journal streamed output to disk so it survives a crash and the generation can be continued
+GENERATION_JOURNAL = config.get('GENERATION_JOURNAL', True)
+JOURNAL_FSYNC_INTERVAL = config.get('JOURNAL_FSYNC_INTERVAL', 1.0)
+# Developer mode: event-loop lag watchdog, timing spans and on-demand profiling
+DEV_MODE = config.get('DEV_MODE', False)
+profiling.enabled = DEV_MODE
+# Upper bound for waiting on the service loop to wind down when the app closes
+WORKER_JOIN_TIMEOUT = 2.0
 
 class Button:
     def __init__(self, master, text, command, side='top', padx=5, pady=5):
@@ -37,25 +108,16 @@ class ParameterInput:
         return self.var.get()
 
 class APIHandler:
-    BASE_URL = "https://api.totalgpt.ai"
-
-    @classmethod
-    def load_api_key(cls):
-        cls.HEADERS = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {config['INFERMATIC_API_KEY']}"
-        }
-
-    @classmethod
-    def fetch_models(cls):
-        cls.load_api_key()
+    @staticmethod
+    async def fetch_models(session, backend):
+        """Return the model ids served by backend, or None if it could not be reached."""
         # TODO: make it try without v1 if it fails
         try:
-            response = requests.get(f"{cls.BASE_URL}/v1/models", headers=cls.HEADERS)
-            response.raise_for_status()
-
-            data = response.json()
-            print("API Response:", json.dumps(data, indent=2))  # Debug print
+            data = await send_limited(session, backend.limiter, PRIORITY_BACKGROUND, "GET", f"{backend.base_url}/v1/models",
+                                      lambda response: response.json(), headers=backend.headers,
+                                      timeout=aiohttp.ClientTimeout(total=60))
+            if DEV_MODE:
+                print(f"API Response from {backend.name}:", json.dumps(data, indent=2))  # Debug print
 
             if isinstance(data, list):
                 return [model.get('id', model.get('name', '')) for model in data if isinstance(model, dict)]
@@ -64,31 +126,56 @@ class APIHandler:
             else:
                 print("Unexpected response structure")
                 return []
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching models: {e}")
-            return []
-
-    @classmethod
-    def generate_text(cls, data):
-        cls.load_api_key()
-        # TODO: make it try without v1 if it fails
-        return requests.post(f"{cls.BASE_URL}/v1/completions", json=data, headers=cls.HEADERS, timeout=300, stream=True)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error fetching models from {backend.name}: {e}")
+            return None
 
     @staticmethod
-    def close_session(response):
-        if response:
-            response.close()
+    async def generate_text(session, backend, data, stall_timeout=STALL_TIMEOUT, priority=PRIORITY_INTERACTIVE):
+        """
+        Stream a completion and yield each decoded SSE payload.
+
+        sock_read bounds the wait for every read, so it doubles as the inter-token stall timeout.
+        Cancelling the consuming task closes the connection at once, freeing the server slot.
+        """
+        # TODO: make it try without v1 if it fails
+        timeout = aiohttp.ClientTimeout(total=None, connect=CONNECT_TIMEOUT, sock_read=stall_timeout)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            # The slot is held for the whole stream so the backend's concurrency cap covers it
+            async with backend.limiter.slot(priority):
+                async with session.post(f"{backend.base_url}/v1/completions", json=data, headers=backend.headers, timeout=timeout) as response:
+                    if response.status == 429 and attempt < RATE_LIMIT_RETRIES:
+                        backend.limiter.backoff(retry_after_seconds(response))
+                        continue
+                    response.raise_for_status()
+                    backend.limiter.reset_backoff()
+                    try:
+                        async for line in response.content:
+                            line = line.strip()
+                            if not line.startswith(b"data:"):
+                                continue
+                            event_data = line[5:].strip().decode("utf-8")
+                            if event_data == '[DONE]':
+                                return
+                            try:
+                                yield json.loads(event_data)
+                            except json.JSONDecodeError as error:
+                                print(error)
+                    except (asyncio.CancelledError, GeneratorExit):
+                        response.close()  # Drop the connection instead of draining it back into the pool
+                        raise
+                    return
 
     @staticmethod
-    async def check_grammar(text):
+    async def check_grammar(session, text):
         try:
-            response = requests.post(
+            return await send_limited(
+                session, GRAMMAR_LIMITER, PRIORITY_DEFAULT, "POST",
                 "https://api.languagetool.org/v2/check",
+                lambda response: response.json(),
                 data={"text": text, "language": "auto"}
             )
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             print(f"Error checking grammar: {e}")
             return {}
 
@@ -134,6 +221,14 @@ class PresetManager:
             self.save_presets()
 
 class StyleManager:
+    # Editor tag -> (light mode colour, dark mode colour)
+    TAG_COLORS = {
+        'highlight': ('blue', 'cyan'),
+        'dialogue': ('#8B4513', '#E5C07B'),
+        'md_heading': ('#6A1B9A', '#C678DD'),
+        'lore_mention': ('#00796B', '#56B6C2'),
+    }
+
     def __init__(self, root):
         self.root = root
         self.dark_mode = False
@@ -141,10 +236,29 @@ class StyleManager:
         self.main_text_color = 'black'
         self.dark_background_color = '#1E1E2E'  # Dark blue-ish color
         self.dark_text_color = 'white'
+        self.editors = []  # text widgets whose tags follow the theme
 
+    @timed("apply_styles")
     def toggle_dark_mode(self):
         self.dark_mode = not self.dark_mode
         self.apply_styles(self.root)
+        self.editors = [widget for widget in self.editors if widget.winfo_exists()]
+        for widget in self.editors:
+            self.configure_tags(widget)
+
+    def add_editor(self, widget, font_size):
+        self.editors.append(widget)
+        self.configure_tags(widget, font_size)
+
+    def configure_tags(self, widget, font_size=None):
+        """Set the theme's tag colours (and fonts, when font_size is given) on an editor."""
+        for tag, colors in self.TAG_COLORS.items():
+            widget.tag_config(tag, foreground=colors[self.dark_mode])
+        if font_size is not None:
+            widget.tag_config('md_heading', font=("TkDefaultFont", font_size, "bold"))
+            widget.tag_config('md_strong', font=("TkDefaultFont", font_size, "bold"))
+            widget.tag_config('md_emphasis', font=("TkDefaultFont", font_size, "italic"))
+        widget.tag_raise('highlight')  # new output stays recognisable inside dialogue
 
     def apply_styles(self, widget):
         background_color = self.dark_background_color if self.dark_mode else self.main_background_color
@@ -158,19 +272,16 @@ class StyleManager:
             tk.Checkbutton: lambda: widget.config(bg=background_color, fg=text_color, selectcolor=background_color),
             tk.Text: lambda: widget.config(bg=background_color, fg=text_color),
             scrolledtext.ScrolledText: lambda: widget.config(bg=background_color, fg=text_color),
-            ttk.Combobox: lambda: self.configure_combobox(widget, 'black', 'white') # default for both modes (improves clarity)
+            ttk.Combobox: lambda: self.configure_combobox(widget, 'black', 'white'), # default for both modes (improves clarity)
+            ttk.Notebook: lambda: None  # only its pages are styled
         }
 
         if type(widget) in widget_styles:
             widget_styles[type(widget)]()
-            if isinstance(widget, tk.Tk) or isinstance(widget, tk.Frame):
+            if isinstance(widget, (tk.Tk, tk.Frame, ttk.Notebook)):
                 for child in widget.winfo_children():
                     self.apply_styles(child)
 
-        # Update any text inside text_widget with highlight tag to match the new color scheme
-        if isinstance(widget, tk.Text) and widget.tag_ranges('highlight'):
-            widget.tag_config('highlight', foreground='blue' if self.dark_mode == False else 'cyan')
-
     def configure_combobox(self, widget, text_color, background_color):
         style = ttk.Style()
         # we don't set theme as it makes the UI uglier
@@ -178,6 +289,60 @@ class StyleManager:
         style.map('TCombobox', foreground=[('focus', text_color)], background=[('focus', background_color)])
         widget.config(style='TCombobox')
 
+class StoryTab:
+    """
+    One open story: its editor, context, generation settings and in-flight generation.
+
+    Chunks streamed into a tab that is not shown are only buffered, then inserted in one go when the
+    tab is selected or saved, so background generations cost no widget work per token.
+    """
+    def __init__(self, app, story_id):
+        self.story_id = story_id
+        self.title = ""
+        self.closed = False
+        self.text_widget = scrolledtext.ScrolledText(app.notebook, wrap='word', width=60, height=20, undo=True,
+                                                     font=("TkDefaultFont", app.font_size))
+        self.frame = self.text_widget.frame
+        self.text_widget.bind("<Button-1>", app.on_text_click)  # Bind click event
+        self.text_widget.bind("<Control-Button-1>", app.on_token_click)
+        # Mirror every edit into an in-memory document so readers need not copy the whole widget
+        self.document = TextWidgetMirror(self.text_widget).document
+        self.saved_text_version = None
+        app.style_manager.add_editor(self.text_widget, app.font_size)
+        self.highlighter = SyntaxHighlighter(self.text_widget, self.document) if SYNTAX_HIGHLIGHT else None
+        self.autocomplete = GhostCompleter(app, self, app.autocomplete_enabled, AUTOCOMPLETE_DELAY_MS, AUTOCOMPLETE_MAX_TOKENS)
+
+        self.memory_text = ""
+        self.author_notes_text = ""
+        self.lorebook_entries_data = {}
+        self.lorebook_changes = set()  # entry names edited since the last save, None to rewrite every entry
+        self.prompt_assembler = PromptAssembler(stable=PREFIX_STABLE_PROMPT)
+        self.retriever = ContextRetriever(RETRIEVAL_TOP_K, RETRIEVAL_MAX_TOKENS, RETRIEVAL_RECENT_CHARS,
+                                          lorebook=RETRIEVAL_LOREBOOK) if RETRIEVAL else None
+        self.summarizer = RollingSummarizer(
+            app, SUMMARY_MODEL, SUMMARY_RECENT_CHARS, SUMMARY_CHUNK_CHARS, SUMMARY_MAX_CHUNKS) if ROLLING_SUMMARY else None
+        self.settings = None  # preset, model and parameters, captured when another tab is selected
+        self.context_sections = None  # (summary, retrieved passages, lorebook entries) of the last prompt
+        self.completion_prefix = None  # context sections rendered for autocomplete, None when outdated
+
+        self.cancel_time = None  # perf_counter() timestamp of the last Cancel press
+        self.generation_job = None
+        self.generation_id = 0  # bumped per generation so chunks of a replaced one are dropped
+        self.chunks_received = 0  # chunks streamed into this tab, counted on the service loop
+        self.pending_chunks = []  # (chunk, logprobs) received while the tab was hidden
+        self.last_prompt = ""
+        self.generated_chunks = []  # joined on demand, appending per chunk stays linear
+        self.token_logprobs = None  # TokenLogprobs of the text after the 'generated_start' mark
+        self.grammar_errors = []  # Store grammar errors
+
+    @property
+    def generating(self):
+        return self.generation_job is not None and not self.generation_job.done()
+
+    @property
+    def last_generated_text(self):
+        return "".join(self.generated_chunks)
+
 class TextGeneratorApp:
     def __init__(self, root):
         self.root = root
@@ -185,62 +350,222 @@ class TextGeneratorApp:
         self.root.title("AI Writing Notebook UI")
         self.style_manager = StyleManager(self.root)
 
-        self.lorebook_entries_widgets = []
         self.preset_manager = PresetManager("presets.json")
+        self.bridge = TkBridge(self.root)
+        self.service = ServiceLoop(self.bridge)
+        self.service.start()
+        self.router = BackendRouter(load_backends(config), HEDGE_REQUESTS, HEDGE_PERCENTILE)
+        self.store = StoryStore("workspace.db")
+        self.prober = ModelProber(self, PROBE_INTERVAL, PROBE_MODELS_PER_ROUND) if MODEL_PROBING else None
+        if self.prober is not None:
+            self.prober.start()
+        self.grammar_cache = {}
+        self.font_size = 12  # default font size
+        self.tabs = {}  # notebook page widget name -> StoryTab
+        self.tab = None  # the selected StoryTab
         self.setup_ui()
         self.setup_variables()
         self.fetch_models()
-        self.load_session()
+        story_ids, current_story_id = self.get_initial_story_ids()
+        for story_id in story_ids:
+            self.open_tab(story_id)
+        self.open_story(current_story_id)
 
         self.preset_manager = PresetManager("presets.json")
         self.presets = self.preset_manager.get_preset_names()
         self.update_preset_dropdown()
 
-        self.grammar_cache = {}
-        self.font_size = 12  # default font size
-
-    def save_session(self):
-        text = self.text_widget.get("1.0", tk.END).strip()
-        session_data = {
-            "text": text,
-            "memory": getattr(self, 'memory_text', ''),
-            "author_notes": getattr(self, 'author_notes_text', ''),
-            "lorebook_entries": getattr(self, 'lorebook_entries_data', {})
-        }
+    def get_initial_story_ids(self):
+        """Reopen the stories open last time, migrating a legacy session.json into the workspace on first run."""
+        story_id = self.store.migrate_session_json("session.json")
+        open_ids = json.loads(self.store.get_meta("open_story_ids", "[]"))
+        if story_id is None:
+            story_id = self.store.get_meta("current_story_id")
+            story_id = int(story_id) if story_id is not None else None
+        stories = self.store.list_stories()
+        existing = {row[0] for row in stories}
+        if story_id not in existing:
+            story_id = stories[0][0] if stories else self.store.create_story("Untitled")
+        open_ids = [open_id for open_id in open_ids if open_id in existing and open_id != story_id]
+        return open_ids + [story_id], story_id
+
+    @timed("save_session")
+    def save_session(self, tab=None):
+        tab = tab or self.tab
+        if tab.closed:
+            return  # saved when the tab was closed
+        self.flush_pending(tab)
+        tab.autocomplete.clear()  # ghost text is never part of the story
+        # The story text is only copied out of the document when it changed since the last save
+        version = tab.document.version
+        text = tab.document.text().strip() if version != tab.saved_text_version else None
         try:
-            with open("session.json", "w") as f:
-                json.dump(session_data, f)
-        except IOError as e:
+            self.store.save_story(
+                tab.story_id,
+                text,
+                tab.memory_text,
+                tab.author_notes_text,
+                tab.lorebook_entries_data,
+                tab.lorebook_changes,
+            )
+        except sqlite3.Error as e:
             messagebox.showerror("Error", f"Failed to save session: {e}")
+        else:
+            tab.saved_text_version = version
+            tab.lorebook_changes = set()
 
-    def load_session(self):
-        if not os.path.exists("session.json"):
-            with open("session.json", "w") as f:
-                json.dump({"text": "", "memory": "", "author_notes": "", "lorebook_entries": {}}, f)
-
+    def load_session(self, tab):
         try:
-            with open("session.json", "r") as f:
-                session_data = json.load(f)
-                self.text_widget.delete("1.0", tk.END)
-                self.text_widget.insert(tk.END, session_data.get("text", ""))
-                self.memory_text = session_data.get("memory", "")
-                self.author_notes_text = session_data.get("author_notes", "")
-                self.lorebook_entries_data = session_data.get("lorebook_entries", {})
-        except (json.JSONDecodeError, KeyError) as e:
+            session_data = self.store.load_story(tab.story_id)
+        except (KeyError, sqlite3.Error) as e:
             messagebox.showerror("Session Load Error", str(e))
             self.root.destroy()
-        except IOError as e:
-            messagebox.showerror("Error", f"Failed to load session: {e}")
-            self.root.destroy()
+            return
+        tab.text_widget.delete("1.0", tk.END)
+        tab.text_widget.insert(tk.END, session_data["text"])
+        tab.text_widget.edit_reset()  # loading the story is not an undoable edit
+        tab.saved_text_version = tab.document.version
+        tab.memory_text = session_data["memory"]
+        tab.author_notes_text = session_data["author_notes"]
+        tab.lorebook_entries_data = session_data["lorebook_entries"]
+        tab.lorebook_changes = set()
+        tab.last_prompt = session_data["text"]
+        tab.title = session_data["title"]
+        if tab.highlighter is not None:
+            tab.highlighter.set_keywords(tab.lorebook_entries_data)
+
+    def open_tab(self, story_id):
+        tab = StoryTab(self, story_id)
+        self.style_manager.apply_styles(tab.frame)
+        self.load_session(tab)
+        self.tabs[str(tab.frame)] = tab
+        self.notebook.add(tab.frame, text=tab.title)
+        self.store.set_meta("open_story_ids", json.dumps([open_tab.story_id for open_tab in self.tabs.values()]))
+        self.root.after_idle(self.resume_journal, tab)
+        return tab
+
+    def resume_journal(self, tab):
+        """Restore output streamed before a crash and, if the user agrees, continue the generation."""
+        path = journal_path(tab.story_id)
+        entry = read_journal(path)
+        if entry is None:
+            return
+        header, partial = entry
+        text = tab.document.text()
+        # Only a journal written on top of the saved story text belongs to it, anything else is stale
+        if (tab.closed or tab.generating or not partial
+                or header["base_hash"] != hashlib.md5(text.strip().encode()).hexdigest()):
+            os.remove(path)
+            return
+        print(f"Restoring {len(partial)} characters of an interrupted generation")
+        tab.last_prompt = text.strip()
+        tab.text_widget.edit_separator()  # the restored text is its own undo step
+        tab.text_widget.insert(tk.END, header["separator"])
+        tab.text_widget.mark_set('generated_start', 'end-1c')
+        tab.text_widget.mark_gravity('generated_start', tk.LEFT)
+        tab.token_logprobs = TokenLogprobs(LOGPROBS) if LOGPROBS else None
+        self.render_generated(tab, [(partial, None)])
+        tab.text_widget.edit_separator()
+        # The journal holds text, not tokens, so the budget already spent is estimated from its length
+        remaining = header["max_tokens"] - len(partial) // CHARS_PER_TOKEN
+        if remaining <= 0 or not messagebox.askyesno(
+                "Resume Generation",
+                f"\"{tab.title}\" was generating when the application closed. {len(partial)} characters were "
+                f"restored (Undo removes them).\n\nContinue the generation with about {remaining} more tokens?"):
+            self.save_session(tab)
+            os.remove(path)
+            return
+        self.submit_generation(tab, tab.document.text().lstrip(), max_tokens=remaining)
+
+    def open_story(self, story_id):
+        """Select the tab showing a story, opening a new tab for it if needed."""
+        tab = next((tab for tab in self.tabs.values() if tab.story_id == story_id), None) or self.open_tab(story_id)
+        self.notebook.select(tab.frame)
+        self.on_tab_changed()
+
+    def close_tab(self):
+        tab = self.tab
+        if len(self.tabs) == 1:
+            messagebox.showerror("Error", "At least one story must stay open.")
+            return
+        if self.story_info_open and self.story_info_tab is tab:
+            messagebox.showerror("Error", "Close the Story Info window before closing this story.")
+            return
+        if tab.generating and not messagebox.askyesno("Confirm Close", "This story is still generating. Stop and close it?"):
+            return
+        self.cancel_generation(tab)
+        self.save_session(tab)
+        tab.autocomplete.clear()
+        tab.closed = True
+        del self.tabs[str(tab.frame)]
+        self.notebook.forget(tab.frame)
+        tab.frame.destroy()
+        self.store.set_meta("open_story_ids", json.dumps([open_tab.story_id for open_tab in self.tabs.values()]))
+        self.on_tab_changed()
+
+    def on_tab_changed(self, event=None):
+        selected = self.notebook.select()
+        tab = self.tabs.get(str(selected))
+        if tab is None or tab is self.tab:
+            return
+        if self.tab is not None and not self.tab.closed:
+            self.tab.autocomplete.clear()
+            self.tab.settings = self.capture_settings()
+        self.tab = tab
+        self.apply_settings(tab.settings)
+        self.flush_pending(tab)
+        self.update_generation_controls()
+        self.root.title(f"AI Writing Notebook UI - {tab.title}")
+        self.store.set_meta("current_story_id", str(tab.story_id))
+
+    def capture_settings(self):
+        return {
+            "preset": self.preset_var.get(),
+            "model": self.model_var.get(),
+            "parameters": {name: parameter.var.get() for name, parameter in self.parameters.items()},
+        }
+
+    def apply_settings(self, settings):
+        """Restore a tab's preset, model and parameters; a new tab keeps the current ones."""
+        if settings is None:
+            return
+        self.preset_var.set(settings["preset"])
+        if settings["model"] in self.model_dropdown['values'] or not self.model_dropdown['values']:
+            self.model_var.set(settings["model"])
+        for name, value in settings["parameters"].items():
+            self.parameters[name].var.set(value)
+
+    def update_generation_controls(self, tab=None):
+        """Refresh a tab's label and, for the selected tab, the Generate button."""
+        tab = tab or self.tab
+        if tab.closed:
+            return
+        self.notebook.tab(tab.frame, text=f"{tab.title} (generating)" if tab.generating else tab.title)
+        if tab is self.tab:
+            if tab.generating:
+                self.buttons['generate'].disable()
+            else:
+                self.buttons['generate'].enable()
 
     def on_close(self):
-        self.save_session()
+        if DEV_MODE:
+            self.lag_monitor.stop()
+            print(f"Worst Tk event loop lag: {self.lag_monitor.max_lag * 1000:.0f} ms")
+            print(profiling.format_span_stats())
+        for tab in self.tabs.values():
+            self.cancel_generation(tab)
+        self.service.stop(WORKER_JOIN_TIMEOUT)
+        for tab in self.tabs.values():
+            self.save_session(tab)
+        self.store.close()
         self.root.destroy()
 
     def setup_ui(self):
-        self.text_widget = scrolledtext.ScrolledText(self.root, wrap='word', width=60, height=20)
-        self.text_widget.pack(fill='both', expand=True, side='left', padx=10, pady=10)
-        self.text_widget.bind("<Button-1>", self.on_text_click)  # Bind click event
+        # One tab per open story, see StoryTab
+        self.notebook = ttk.Notebook(self.root)
+        self.notebook.pack(fill='both', expand=True, side='left', padx=10, pady=10)
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.autocomplete_enabled = tk.BooleanVar(value=AUTOCOMPLETE)
 
         control_frame = tk.Frame(self.root)
         control_frame.pack(fill='y', padx=10, pady=10)
@@ -254,6 +579,8 @@ class TextGeneratorApp:
             'retry': Button(button_frame, "Retry", lambda: self.retry_or_undo_generation('retry'), side='left'),
             'undo': Button(button_frame, "Undo", lambda: self.retry_or_undo_generation('undo'), side='left'),
             'info': Button(button_frame, "Story Info", lambda: self.story_info(), side='left'),
+            'stories': Button(button_frame, "Stories", lambda: self.story_browser(), side='left'),
+            'close_tab': Button(button_frame, "Close Tab", self.close_tab, side='left'),
         }
 
         self.setup_advanced_options(control_frame)
@@ -263,6 +590,10 @@ class TextGeneratorApp:
             self.audio_toggle_checkbox = tk.Checkbutton(control_frame, text="Enable Audio", variable=self.audio_toggle_var)
             self.audio_toggle_checkbox.pack(fill='x', pady=5)
 
+        self.autocomplete_checkbox = tk.Checkbutton(control_frame, text="Autocomplete (Tab to accept)",
+                                                    variable=self.autocomplete_enabled, command=lambda: self.tab.autocomplete.clear())
+        self.autocomplete_checkbox.pack(fill='x', pady=5)
+
         # Bottom buttons
         bottom_button_frame = tk.Frame(self.root)
         bottom_button_frame.pack(fill='x', side='bottom', padx=10, pady=(0, 10))
@@ -276,10 +607,58 @@ class TextGeneratorApp:
 
         self.grammar_button = Button(bottom_button_frame, text="Check Grammar", command=self.check_grammar, side='left')
         tk.Button(bottom_button_frame, text="Markdown", command=self.show_markdown_viewer).pack(side='left')  # New Markdown button
+        tk.Button(bottom_button_frame, text="Find", command=self.show_find_replace).pack(side='left')
+        self.root.bind("<Control-f>", lambda event: self.show_find_replace())
+
+        if DEV_MODE:
+            self.lag_monitor = LagMonitor(self.root)
+            self.profile_session = ProfileSession()
+            self.profile_button = tk.Button(bottom_button_frame, text="Start Profile", command=self.toggle_profiling)
+            self.profile_button.pack(side='left')
+            self.memory_button = tk.Button(bottom_button_frame, text="Start Memory Trace", command=self.toggle_memory_trace)
+            self.memory_button.pack(side='left')
+
+        self.rate_status_label = tk.Label(bottom_button_frame, text="", font=("TkDefaultFont", 8))
+        self.rate_status_label.pack(side='right')
+        self.update_rate_status()
 
     def toggle_dark_mode(self):
         self.style_manager.toggle_dark_mode()
 
+    def toggle_profiling(self):
+        """Developer mode: capture cProfile data and sampled Tk-thread stacks between two clicks."""
+        if not self.profile_session.profiling:
+            self.profile_session.start_cpu()
+            self.lag_monitor.start_sampling()
+            self.profile_button.config(text="Stop Profile")
+            return
+        prof_path = self.profile_session.stop_cpu("profile.prof")
+        folded_path = self.lag_monitor.stop_sampling("profile.folded")
+        self.profile_button.config(text="Start Profile")
+        print(f"Wrote {prof_path} (pstats/snakeviz) and {folded_path} (flamegraph.pl/speedscope)")
+        print(profiling.format_span_stats())
+
+    def toggle_memory_trace(self):
+        if not self.profile_session.tracing:
+            self.profile_session.start_memory()
+            self.memory_button.config(text="Stop Memory Trace")
+            return
+        summary_path = self.profile_session.stop_memory("memory.snapshot")
+        self.memory_button.config(text="Start Memory Trace")
+        print(f"Wrote memory.snapshot (tracemalloc) and {summary_path}")
+
+    def update_rate_status(self):
+        """Show queued requests and recent waits of any rate limiter that is currently holding work back."""
+        parts = []
+        for limiter in all_limiters():
+            stats = limiter.stats()
+            if stats['blocked_for'] > 0:
+                parts.append(f"{limiter.name}: paused {stats['blocked_for']:.0f}s, {stats['queue_depth']} queued")
+            elif stats['queue_depth'] or stats['last_wait'] > 0.5:
+                parts.append(f"{limiter.name}: {stats['queue_depth']} queued, waited {stats['last_wait']:.1f}s")
+        self.rate_status_label.config(text=" | ".join(parts))
+        self.root.after(1000, self.update_rate_status)
+
     def setup_advanced_options(self, parent):
         self.advanced_frame = tk.Frame(parent)
         self.advanced_frame.pack(side='top', fill='x', pady=10)
@@ -321,6 +700,10 @@ class TextGeneratorApp:
         self.model_var = tk.StringVar(value="L3-70B-Euryale-v2.1")
         self.model_dropdown = ttk.Combobox(self.advanced_options, textvariable=self.model_var, state="readonly")
         self.model_dropdown.pack(side='top', fill='x')
+        if self.prober is not None:
+            self.model_speed_label = tk.Label(self.advanced_options, text="", font=("TkDefaultFont", 8))
+            self.model_speed_label.pack(side='top', anchor='w')
+            self.model_var.trace_add("write", lambda *args: self.update_model_speed())
 
         self.parameters = {
             "max_tokens": ParameterInput(self.advanced_options, "Max Tokens:", 222),
@@ -394,14 +777,15 @@ class TextGeneratorApp:
                 print(f"Warning: Parameter '{param}' in preset '{preset_name}' is invalid or has an incorrect type.")
 
     def setup_variables(self):
-        self.cancel_requested = False
-        self.last_prompt = ""
-        self.last_generated_text = ""
-        self.grammar_errors = []  # Store grammar errors
         self.context_viewer_open = False
         self.story_info_open = False
+        self.story_info_tab = None  # the tab whose Story Info window is open
+        self.story_browser_open = False
+        self.lorebook_editor = None
+        self.find_dialog = None
 
-    def prepare_prompt(self, prompt):
+    @timed("prepare_prompt")
+    def prepare_prompt(self, prompt, tab=None):
         """
         Prepares the final prompt for text generation by integrating memory text, author notes, and lorebook entries.
 
@@ -412,49 +796,48 @@ class TextGeneratorApp:
             str: The final prompt with integrated contextual information at the correct positions.
 
         Notes:
-            - Order -> Memory Text -> Lorebook Entries -> Prompt -> Author Notes
+            - Order -> Memory Text -> Lorebook Entries -> Summary -> Prompt -> Author Notes
+            - See prompt_builder for the classic and prefix-stable layouts.
+            - With ROLLING_SUMMARY, older text that has been summarized is replaced by its summary.
+            - With RETRIEVAL, relevant passages that are not in the prompt verbatim are added before it.
         """
-        # Retrieve memory text and author notes text, defaulting to empty strings if not set
-        memory_text = getattr(self, 'memory_text', '')
-        author_notes_text = getattr(self, 'author_notes_text', '')
-
-        # Retrieve lorebook entries widgets
-        lorebook_entries = self.lorebook_entries_widgets
-
-        # Construct lorebook text only if there are actual entries
-        lorebook_text = ""
-        if lorebook_entries:
-            lorebook_text = "\n".join(
-                f"Entry {idx+1}: {name_entry.get('1.0', tk.END).strip()}\n{content_entry.get('1.0', tk.END).strip()}"
-                for idx, (_, name_entry, content_entry) in enumerate(lorebook_entries)
-                if name_entry.get('1.0', tk.END).strip() and content_entry.get('1.0', tk.END).strip()
-            )
-
-        # Integrate memory text and lorebook text into the prompt if they are not empty
-        if memory_text:
-            prompt = memory_text + "\n" + lorebook_text + "\n" + prompt
-        elif lorebook_text:
-            prompt = lorebook_text + "\n" + prompt
-
-        # Integrate author notes text into the prompt if it is not empty
-        if author_notes_text:
-            paragraphs = re.split(r'(?<=[.!?])\s+', prompt)
-            if len(paragraphs) > 1:
-                last_two_paragraphs = paragraphs[-2:]
-                rest_of_prompt = paragraphs[:-2]
-                prompt = '\n'.join(rest_of_prompt + [last_two_paragraphs[0], author_notes_text, last_two_paragraphs[1]])
-            else:
-                prompt = '\n'.join([author_notes_text] + paragraphs)
-
-        return prompt
+        tab = tab or self.tab
+        summary_text = ""
+        if tab.summarizer is not None:
+            summary_text, prompt = tab.summarizer.condense(prompt)
+        retrieved_text = ""
+        lorebook_entries = tab.lorebook_entries_data
+        if tab.retriever is not None:
+            tab.retriever.sync(tab.document, lorebook_entries)
+            retrieved_text, prompt, lorebook_entries = tab.retriever.select(prompt, lorebook_entries)
+        # Kept for autocomplete, which must not run the summarizer and retriever on every typing pause
+        tab.context_sections = (summary_text, retrieved_text, lorebook_entries)
+        tab.completion_prefix = None
+        return tab.prompt_assembler.assemble(
+            prompt,
+            tab.memory_text,
+            tab.author_notes_text,
+            lorebook_entries,
+            summary_text,
+            retrieved_text,
+        )
+
+    def update_summaries(self, tab):
+        """Queue background summaries for older story text that has none yet."""
+        if tab.summarizer is not None and not tab.closed:
+            tab.summarizer.update(tab.document.text().strip())
 
     def show_context_viewer(self):
         if self.context_viewer_open:
             return
 
         self.context_viewer_button.disable()
-        raw_prompt = self.text_widget.get("1.0", tk.END).strip()
-        context_prompt = self.prepare_prompt(raw_prompt)
+        tab = self.story_info_tab
+        tab.autocomplete.clear()
+        if self.lorebook_editor is not None:
+            self.apply_lorebook_edits(tab)  # show unsaved lorebook edits too
+        raw_prompt = tab.document.text().strip()
+        context_prompt = self.prepare_prompt(raw_prompt, tab)
 
         popup = tk.Toplevel(self.root)
         popup.title("Context Viewer")
@@ -480,36 +863,86 @@ class TextGeneratorApp:
             self.advanced_options.pack_forget()
 
     def fetch_models(self):
-        def fetch():
-            models = APIHandler.fetch_models()
-            if models:
-                self.root.after(0, lambda: self.update_model_dropdown(models))
-            else:
+        """Health-check all backends, refresh the model dropdown and schedule the next check."""
+        def on_models(models):
+            if not models:
                 print("No models fetched or empty model list returned")
+            elif list(self.model_dropdown['values']) != self.sort_models(models):
+                self.update_model_dropdown(models)
+            self.root.after(HEALTH_CHECK_INTERVAL * 1000, self.fetch_models)
 
-        threading.Thread(target=fetch).start()
-
-    def start_generation(self):
-        raw_prompt = self.text_widget.get("1.0", tk.END).strip()
-        self.last_prompt = raw_prompt
-        prepared_prompt = self.prepare_prompt(raw_prompt)
-        self.cancel_requested = False
-        self.text_widget.tag_remove('highlight', '1.0', tk.END)
-
-        # Disable the generate button to prevent multiple requests
-        self.buttons['generate'].disable()
+        def on_error(error):
+            print(f"Backend health check failed: {error!r}")
+            self.root.after(HEALTH_CHECK_INTERVAL * 1000, self.fetch_models)
 
-        threading.Thread(target=self.generate_text, args=(prepared_prompt,)).start()
-        self.save_session()
+        self.service.submit(
+            lambda session: self.router.refresh(lambda backend: APIHandler.fetch_models(session, backend)),
+            PRIORITY_BACKGROUND, on_result=on_models, on_error=on_error)
 
-    def cancel_generation(self):
-        self.cancel_requested = True
+    def start_generation(self):
+        tab = self.tab
+        if tab.generating:
+            return
+        tab.autocomplete.clear()
+        raw_prompt = tab.document.text().strip()
+        tab.last_prompt = raw_prompt
+        tab.text_widget.tag_remove('highlight', '1.0', tk.END)
+        # Generated text is appended at the end; the mark keeps token offsets anchored if earlier text is edited
+        tab.text_widget.mark_set('generated_start', 'end-1c')
+        tab.text_widget.mark_gravity('generated_start', tk.LEFT)
+        tab.token_logprobs = TokenLogprobs(LOGPROBS) if LOGPROBS else None
+        self.submit_generation(tab, raw_prompt)
+
+    def submit_generation(self, tab, raw_prompt, max_tokens=None):
+        prepared_prompt = self.prepare_prompt(raw_prompt, tab)
+        matched_chars, matched_tokens = tab.prompt_assembler.record_request(prepared_prompt)
+        print(f"Prompt prefix reused from previous request: {matched_chars}/{len(prepared_prompt)} chars (~{matched_tokens} tokens)")
+
+        # Widget state is read here on the Tk thread; the request itself runs on the service loop
+        data = self.build_request_data(prepared_prompt)
+        if max_tokens is not None:
+            data['max_tokens'] = max_tokens
+        if LOGPROBS:
+            data['logprobs'] = LOGPROBS
+        play_audio = config['USE_TTS'] and self.audio_toggle_var.get()
+        journal = self.start_journal(tab, data['max_tokens']) if GENERATION_JOURNAL else None
+        tab.generation_id += 1
+        generation_id = tab.generation_id
+        tab.generation_job = self.service.submit(
+            lambda session: self.generate_text(session, tab, generation_id, data, play_audio, journal), PRIORITY_INTERACTIVE)
+        # Disable the generate button to prevent multiple requests in this tab
+        self.update_generation_controls(tab)
+        self.save_session(tab)
+
+    def start_journal(self, tab, max_tokens):
+        """Open the journal of a generation that continues the tab's current text, as saved next."""
+        text = tab.document.text()
+        header = {
+            "story_id": tab.story_id,
+            "base_hash": hashlib.md5(text.strip().encode()).hexdigest(),
+            "separator": text[len(text.rstrip()):],  # trailing whitespace the saved text drops
+            "max_tokens": max_tokens,
+        }
+        try:
+            return GenerationJournal(journal_path(tab.story_id), header, JOURNAL_FSYNC_INTERVAL)
+        except OSError as e:
+            print(f"Generation journal unavailable: {e}")
+            return None
+
+    def cancel_generation(self, tab=None):
+        tab = tab or self.tab
+        if tab.generating:
+            tab.cancel_time = time.perf_counter()
+            # Cancelling the task closes the connection right away instead of waiting for the next SSE event
+            tab.generation_job.cancel()
+            tab.generation_job = None
+            tab.generation_id += 1  # chunks already queued for the Tk thread are dropped
         if config['USE_TTS']:
             stop_audio()
-        self.buttons['generate'].enable()
+        self.update_generation_controls(tab)
 
-    def generate_text(self, prompt):
-        data = {
+    def build_request_data(self, prompt):
+        return {
             "model": self.model_var.get(),
             "prompt": prompt,
             "stream": True,
@@ -517,117 +950,300 @@ class TextGeneratorApp:
             **{k: int(v.get()) if k in ['max_tokens', 'top_k'] else v.get() for k, v in self.parameters.items()}
         }
 
+    async def generate_text(self, session, tab, generation_id, data, play_audio=False, journal=None):
+        """Runs on the service loop; all widget updates are posted back through the Tk bridge."""
+        prompt = data['prompt']
+        tab.generated_chunks = []
+        request_start = tab.chunks_received  # chunks of the current request are counted from here
+        retries_left = STALL_RETRIES
+        repetition_retries_left = REPETITION_RETRIES
+        detector = RepetitionDetector() if REPETITION_DETECTION else None
         try:
-            response = APIHandler.generate_text(data)
-            response.raise_for_status()
-            client = sseclient.SSEClient(response)
-            self.last_generated_text = ""
-            for event in client.events():
-                if self.cancel_requested:
-                    APIHandler.close_session(response)  # Close the request to abort the server-side processing
-                    break
-                if event.data:
-                    try:
-                        if event.data.strip() == '[DONE]':
-                            break
-                        payload = json.loads(event.data)
-                        if 'text' in payload['choices'][0]:
-                            chunk = payload['choices'][0]['text']
-                            if chunk in ['<|eot_id|>', '<|im_end|>']:
-                                break
-                            self.last_generated_text += chunk
-                            self.text_widget.insert(tk.END, chunk, 'highlight')  # Tag new text
-                            if self.style_manager.dark_mode == False:
-                                self.text_widget.tag_config('highlight', foreground='blue')  # Style the tag
-                            else:
-                                self.text_widget.tag_config('highlight', foreground='cyan')
-                            self.text_widget.see(tk.END)
-                        elif 'finish_reason' in payload['choices'][0]:
-                            print(f"Text generation finished. Reason: {payload['choices'][0]['finish_reason']}")
-                    except (json.JSONDecodeError, KeyError) as error:
-                        print(error)
-                        pass
-
-        except requests.exceptions.Timeout:
-            self.text_widget.insert(tk.END, "The request timed out")
-        except json.JSONDecodeError:
-            self.text_widget.insert(tk.END, "Failed to decode JSON response")
-
+            while True:
+                try:
+                    await self.stream_completion(session, tab, generation_id, data, detector, journal)
+                    if detector is None or detector.keep is None:
+                        break
+                    generated = tab.last_generated_text
+                    print(f"Stopped a runaway generation ({detector.reason}), "
+                          f"removing {len(generated) - detector.keep} repeated characters")
+                    tab.generated_chunks = [generated[:detector.keep]]
+                    tokens_received = tab.chunks_received - request_start
+                    retrying = repetition_retries_left > 0 and tokens_received < data['max_tokens']
+                    self.bridge.post(self.trim_generated, tab, generation_id, len(generated) - detector.keep,
+                                     detector.reason, retrying)
+                    if journal is not None:
+                        journal.truncate(detector.keep)
+                    if not retrying:
+                        break
+                    # Continue from the text before the loop, discouraging the model from repeating it
+                    repetition_retries_left -= 1
+                    data = {**data, "prompt": prompt + tab.last_generated_text,
+                            "max_tokens": data['max_tokens'] - tokens_received,
+                            "repetition_penalty": float(data.get('repetition_penalty', 1.0)) + REPETITION_PENALTY_STEP}
+                    print(f"Retrying with repetition penalty {data['repetition_penalty']:.2f}")
+                    request_start = tab.chunks_received
+                    detector = RepetitionDetector()
+                    detector.feed(tab.last_generated_text)  # keep offsets relative to the whole generation
+                except (asyncio.TimeoutError, aiohttp.ClientError) as error:
+                    stalled = isinstance(error, asyncio.TimeoutError)
+                    if not stalled and not tab.generated_chunks:
+                        raise  # nothing streamed yet and the router already failed over
+                    tokens_received = tab.chunks_received - request_start
+                    if retries_left <= 0 or tokens_received >= data['max_tokens']:
+                        if stalled:
+                            self.bridge.post(self.append_notice, tab, generation_id, "The request timed out")
+                        else:
+                            print(f"Error during generation: {error}")
+                        break
+                    # Resume from what already streamed instead of regenerating the whole completion
+                    retries_left -= 1
+                    if stalled:
+                        print(f"Stream stalled for {STALL_TIMEOUT}s, retrying ({retries_left} retries left)")
+                    else:
+                        print(f"Connection lost ({error}), continuing ({retries_left} retries left)")
+                    data = {**data, "prompt": prompt + tab.last_generated_text,
+                            "max_tokens": data['max_tokens'] - tokens_received}
+                    request_start = tab.chunks_received
+        except aiohttp.ClientError as e:
+            print(f"Error during generation: {e}")
+        except asyncio.CancelledError:
+            if tab.cancel_time is not None:
+                print(f"Generation cancelled in {(time.perf_counter() - tab.cancel_time) * 1000:.1f} ms")
+                tab.cancel_time = None
+            self.bridge.post(self.save_session, tab)
+            if journal is not None:
+                self.bridge.post(journal.discard)  # after the save above, the bridge keeps the order
+            raise
         finally:
-            self.buttons['generate'].enable()
+            self.bridge.post(self.finish_generation, tab, generation_id)
 
-        if config['USE_TTS']:
-            if self.audio_toggle_var.get():
-                generate_voice(self.last_generated_text)
+        if play_audio:
+            self.service.submit(lambda tts_session: play_voice(tts_session, tab.last_generated_text), PRIORITY_BACKGROUND)
+
+        self.bridge.post(self.save_session, tab)
+        if journal is not None:
+            self.bridge.post(journal.discard)
+        self.bridge.post(self.update_summaries, tab)
 
-        self.save_session()
+    def finish_generation(self, tab, generation_id):
+        if generation_id == tab.generation_id:
+            tab.generation_job = None  # the task is about to return, do not wait for it to be done
+            self.update_generation_controls(tab)
+
+    async def stream_completion(self, session, tab, generation_id, data, detector=None, journal=None):
+        """
+        Stream one completion request into a tab and return how many chunks arrived.
+
+        When the detector finds a repetition loop the stream is closed at once, which aborts the request.
+        Every chunk is also appended to the journal, if any.
+        """
+        received = 0
+        stream = self.open_completion_stream(session, data)
+        async with aclosing(stream):
+            async for payload in stream:
+                try:
+                    if 'text' in payload['choices'][0]:
+                        chunk = payload['choices'][0]['text']
+                        if chunk in ['<|eot_id|>', '<|im_end|>']:
+                            break
+                        received += 1
+                        tab.chunks_received += 1
+                        tab.generated_chunks.append(chunk)
+                        if journal is not None:
+                            journal.append(chunk)
+                        self.bridge.post(self.insert_generated_chunk, tab, generation_id, chunk,
+                                         payload['choices'][0].get('logprobs'))
+                        if detector is not None and detector.feed(chunk) is not None:
+                            break
+                    elif 'finish_reason' in payload['choices'][0]:
+                        print(f"Text generation finished. Reason: {payload['choices'][0]['finish_reason']}")
+                    if payload.get('usage'):
+                        cached = (payload['usage'].get('prompt_tokens_details') or {}).get('cached_tokens')
+                        if cached is not None:
+                            print(f"Server prefix cache hit: {cached}/{payload['usage'].get('prompt_tokens')} prompt tokens")
+                except (KeyError, IndexError) as error:
+                    print(error)
+        return received
+
+    def open_completion_stream(self, session, data, priority=PRIORITY_INTERACTIVE):
+        """Stream completion payloads for data from the best backend for its model."""
+        return self.router.stream(
+            data['model'], lambda backend: APIHandler.generate_text(session, backend, data, priority=priority))
+
+    def insert_generated_chunk(self, tab, generation_id, chunk, logprobs=None):
+        if generation_id != tab.generation_id or tab.closed:
+            return  # left over from a cancelled or replaced generation
+        if tab is not self.tab:
+            tab.pending_chunks.append((chunk, logprobs))  # rendered when the tab is shown
+            return
+        self.render_generated(tab, [(chunk, logprobs)])
+
+    def flush_pending(self, tab):
+        if tab.pending_chunks:
+            chunks, tab.pending_chunks = tab.pending_chunks, []
+            self.render_generated(tab, chunks)
+
+    def render_generated(self, tab, chunks):
+        """Insert generated (chunk, logprobs) pairs at the end of a tab with a single widget insert."""
+        if tab.token_logprobs is not None:
+            for chunk, logprobs in chunks:
+                tab.token_logprobs.add_chunk(chunk, logprobs)
+        tab.text_widget.insert(tk.END, "".join(chunk for chunk, _ in chunks), 'highlight')  # Tag new text, styled by StyleManager
+        tab.text_widget.see(tk.END)
+
+    def trim_generated(self, tab, generation_id, count, reason, retrying):
+        """Remove the last count generated characters, the repeated tail of a runaway generation."""
+        if generation_id != tab.generation_id or tab.closed or count <= 0:
+            return
+        self.flush_pending(tab)
+        tab.text_widget.edit_separator()  # the removal is its own undo step
+        tab.text_widget.delete(f"end-1c - {count} chars", "end-1c")
+        tab.text_widget.edit_separator()
+        store = tab.token_logprobs
+        if store is not None:
+            keep = store.length - count
+            index = store.token_at(keep)
+            if index is not None:
+                partial = store.token(index)[:keep - store.offsets[index]]
+                store.truncate(index)
+                if partial:
+                    store.append(partial)  # the cut went through a token, keep its start without alternatives
+        follow_up = ("Generation continues with a higher repetition penalty." if retrying else
+                     "Undo restores the removed text.")
+        messagebox.showinfo("Repetition Detected",
+                            f"A generation in \"{tab.title}\" fell into a loop ({reason}) and was stopped; "
+                            f"{count} repeated characters were removed. {follow_up}")
+
+    def append_notice(self, tab, generation_id, text):
+        if generation_id == tab.generation_id and not tab.closed:
+            self.flush_pending(tab)
+            tab.text_widget.insert(tk.END, text)
 
     def retry_or_undo_generation(self, action):
-        if action == 'retry':
-            self.cancel_requested = False
-        self.text_widget.delete("1.0", tk.END)
-        self.text_widget.insert(tk.END, self.last_prompt)
-        if config['USE_TTS']:
-            stop_audio()
+        tab = self.tab
+        self.cancel_generation(tab)
+        tab.token_logprobs = None
+        tab.text_widget.delete("1.0", tk.END)
+        tab.text_widget.insert(tk.END, tab.last_prompt)
         if action == 'retry':
             self.start_generation()
         else:
-            self.save_session()
+            self.save_session(tab)
 
     def check_grammar(self):
-        """Run grammar check in background thread to prevent UI freezing. Check the last 19k characters."""
+        """Run grammar check on the service loop to prevent UI freezing. Check the last 19k characters."""
+        tab = self.tab
         # disables grammar button until it finishes running
         self.grammar_button.disable()
-        threading.Thread(target=self._check_grammar_async).start()
-
-    def _check_grammar_async(self):
-        """Asynchronous grammar check implementation. Check the last 19k characters."""
-        full_text = self.text_widget.get("1.0", "end-1c")
-        text_to_check = full_text[-19000:] # api free limit is 20k, use 19k for api overhead
-        offset = len(full_text) - len(text_to_check)
+        tab.autocomplete.clear()
+        text_to_check = tab.document.tail(19000) # api free limit is 20k, use 19k for api overhead
+        offset = tab.document.length - len(text_to_check)
 
         text_hash = hashlib.md5(text_to_check.encode()).hexdigest()
         if text_hash in self.grammar_cache:
-            results = self.grammar_cache[text_hash]
-        else:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            results = loop.run_until_complete(APIHandler.check_grammar(text_to_check))
-            loop.close()
-            self.grammar_cache[text_hash] = results
+            self.on_grammar_results(tab, self.grammar_cache[text_hash], text_hash, offset)
+            return
+
+        self.service.submit(
+            lambda session: APIHandler.check_grammar(session, text_to_check), PRIORITY_DEFAULT,
+            on_result=lambda results: self.on_grammar_results(tab, results, text_hash, offset),
+            on_error=lambda e: self.grammar_button.enable())
 
-        self.root.after(0, lambda: self.display_grammar_errors(results, offset))
-        self.root.after(0, self.grammar_button.enable)
+    def on_grammar_results(self, tab, results, text_hash, offset):
+        self.grammar_cache[text_hash] = results
+        if not tab.closed:
+            self.display_grammar_errors(tab, results, offset)
+        self.grammar_button.enable()
 
-    def display_grammar_errors(self, results, offset):
+    @timed("display_grammar_errors")
+    def display_grammar_errors(self, tab, results, offset):
         """Display grammar errors with relative positioning based on the last 19k characters"""
-        self.grammar_errors = []  # Clear previous errors
-        self.text_widget.tag_remove('grammar_error', '1.0', tk.END)  # Clear previous highlights
+        tab.text_widget.tag_remove('grammar_error', '1.0', tk.END)  # Clear previous highlights
+        tab.text_widget.tag_config('grammar_error', background='yellow')
+        # Offsets are mapped to line.column through the document instead of one Tk index query per bound
+        tab.grammar_errors = grammar_error_spans(tab.document, results, offset)
+        for start_index, end_index, message, _ in tab.grammar_errors:
+            print(f"Error: {message}")
+            print(f"Start index: {start_index}, End index: {end_index}")
+            tab.text_widget.tag_add('grammar_error', start_index, end_index)
 
-        if 'matches' in results:
-            for match in results['matches']:
-                start_index = self.get_text_widget_index(match['offset'] + offset)
-                end_index = self.get_text_widget_index(match['offset'] + match['length'] + offset)
+    def on_text_click(self, event):
+        tab = self.tab
+        index = tab.text_widget.index(f"@{event.x},{event.y}")
 
-                print(f"Error: {match['message']}")
-                print(f"Start index: {start_index}, End index: {end_index}")
+        for start, end, message, replacements in tab.grammar_errors:
+            if tab.text_widget.compare(index, ">=", start) and tab.text_widget.compare(index, "<", end):
+                self.show_suggestions_popup(tab, start, end, message, replacements)
+                break
 
-                self.text_widget.tag_add('grammar_error', start_index, end_index)
-                self.text_widget.tag_config('grammar_error', background='yellow')
-                self.grammar_errors.append((start_index, end_index, match['message'], match['replacements']))
+    def on_token_click(self, event):
+        """Offer the alternatives the model considered for the generated token under the cursor."""
+        tab = self.tab
+        tab.autocomplete.clear()
+        store = tab.token_logprobs
+        if store is None or not len(store):
+            return "break"
+        if tab.generating:
+            return "break"  # chunks still in flight would land after the substituted token
+        # Alternatives are only valid while the generated text is exactly what the model produced
+        if tab.text_widget.get('generated_start', f'generated_start + {store.length} chars') != store.text():
+            tab.token_logprobs = None
+            return "break"
+        index = tab.text_widget.index(f"@{event.x},{event.y}")
+        if tab.text_widget.compare(index, "<", 'generated_start'):
+            return "break"
+        offset = tab.text_widget.count('generated_start', index, 'chars')
+        token_index = store.token_at(offset[0] if offset else 0)
+        if token_index is None:
+            return "break"
+        self.show_token_alternatives(tab, token_index)
+        return "break"
+
+    def show_token_alternatives(self, tab, token_index):
+        store = tab.token_logprobs
+        start, end = store.span(token_index)
+        tab.text_widget.tag_add('token_choice', f'generated_start + {start} chars', f'generated_start + {end} chars')
+        tab.text_widget.tag_config('token_choice', background='light blue')
 
-    def get_text_widget_index(self, char_index):
-        return self.text_widget.index(f"1.0 + {char_index} chars")
+        popup = tk.Toplevel(self.root)
+        popup.title("Token Alternatives")
+        popup.protocol("WM_DELETE_WINDOW", lambda: self.close_token_alternatives(tab, popup))
+
+        tk.Label(popup, text=f"Chosen: {store.token(token_index)!r} ({store.probability(token_index):.1%})",
+                 wraplength=400).pack(pady=10)
+        alternatives = store.alternatives(token_index)
+        if not alternatives:
+            tk.Label(popup, text="No alternatives were returned for this token.").pack(padx=10, pady=5)
+        for token, probability in alternatives:
+            button = tk.Button(popup, text=f"{token!r}  {probability:.1%}",
+                               command=lambda t=token, p=popup: self.substitute_token(tab, token_index, t, p))
+            button.pack(fill='x', padx=10, pady=5)
 
-    def on_text_click(self, event):
-        index = self.text_widget.index(f"@{event.x},{event.y}")
+    def close_token_alternatives(self, tab, popup):
+        if not tab.closed:
+            tab.text_widget.tag_remove('token_choice', '1.0', tk.END)
+        popup.destroy()
 
-        for start, end, message, replacements in self.grammar_errors:
-            if self.text_widget.compare(index, ">=", start) and self.text_widget.compare(index, "<", end):
-                self.show_suggestions_popup(start, end, message, replacements)
-                break
+    def substitute_token(self, tab, token_index, token, popup):
+        """Replace a generated token with an alternative and continue generating from there."""
+        self.close_token_alternatives(tab, popup)
+        store = tab.token_logprobs
+        if store is None or tab.closed or tab.generating:
+            return
+        logprob = store.alternative_logprob(token_index, token)
+        start, _ = store.span(token_index)
+        store.truncate(token_index)
+        tab.text_widget.delete(f'generated_start + {start} chars', 'end-1c')
+        self.render_generated(tab, [(token, {"tokens": [token], "token_logprobs": [logprob]})])
+        remaining = int(self.parameters['max_tokens'].get()) - len(store)
+        if remaining <= 0:
+            self.save_session(tab)
+            return
+        # Only the tail after the substituted token is regenerated; its tokens join the same span
+        self.submit_generation(tab, tab.document.text().lstrip(), max_tokens=remaining)
 
-    def show_suggestions_popup(self, start, end, message, replacements):
+    def show_suggestions_popup(self, tab, start, end, message, replacements):
         popup = tk.Toplevel(self.root)
         popup.title("Grammar Suggestions")
 
@@ -635,84 +1251,79 @@ class TextGeneratorApp:
 
         for replacement in replacements:
             suggestion = replacement['value']
-            button = tk.Button(popup, text=suggestion, command=lambda s=suggestion, p=popup: self.apply_suggestion(start, end, s, p))
+            button = tk.Button(popup, text=suggestion, command=lambda s=suggestion, p=popup: self.apply_suggestion(tab, start, end, s, p))
             button.pack(fill='x', padx=10, pady=5)
 
-    def apply_suggestion(self, start, end, suggestion, popup):
-        self.text_widget.delete(start, end)
-        self.text_widget.insert(start, suggestion)
-        self.text_widget.tag_remove('grammar_error', start, end)
-        self.save_session()
+    def apply_suggestion(self, tab, start, end, suggestion, popup):
+        if not tab.closed:
+            tab.text_widget.delete(start, end)
+            tab.text_widget.insert(start, suggestion)
+            tab.text_widget.tag_remove('grammar_error', start, end)
+            self.save_session(tab)
         popup.destroy()
 
-    def group_models_by_size(self, models):
-        size_pattern = re.compile(r'(\d+)x(\d+)[bB]|(\d+)[bB]', re.IGNORECASE)
-
-        def get_size(model_name):
-            match = size_pattern.search(model_name)
-            if match:
-                if match.group(1) and match.group(2):  # multiplied size
-                    multiplier = int(match.group(1))
-                    size = int(match.group(2))
-                    return multiplier * size
-                else:  # direct size
-                    size = int(match.group(3))
-                    return size
-            else:
-                return float('inf')  # place at the end
-
-        # Sort models based on size and then alphabetically
-        sorted_models = sorted(models, key=lambda x: (get_size(x), x))
+    def sort_models(self, models):
+        """Models by measured speed with SORT_MODELS_BY_SPEED, otherwise by parameter count."""
+        sorted_models = group_models_by_size(models)
+        if SORT_MODELS_BY_SPEED and self.prober is not None:
+            sorted_models = rank_models_by_speed(sorted_models, self.prober.stats)
         return sorted_models
 
+    def on_model_stats_changed(self):
+        self.update_model_speed()
+        models = list(self.model_dropdown['values'])
+        if SORT_MODELS_BY_SPEED and models != self.sort_models(models):
+            self.update_model_dropdown(models)
+
+    def update_model_speed(self):
+        stats = self.prober.stats.get(self.model_var.get())
+        self.model_speed_label.config(text=stats.describe() if stats else "Speed not measured yet")
+
     def update_model_dropdown(self, models):
-        sorted_models = self.group_models_by_size(models)
+        sorted_models = self.sort_models(models)
         # sorted_models = sorted(models)
+        refreshing = bool(self.model_dropdown['values'])
         self.model_dropdown['values'] = sorted_models
-        if sorted_models:
+        # Periodic health checks refresh the list, keep the user's choice when it is still served
+        if sorted_models and not (refreshing and self.model_var.get() in sorted_models):
             self.model_var.set(sorted_models[0])
 
     def increase_font_size(self):
         self.font_size = min(32, self.font_size + 2)  # cap font size at 32
-        self.text_widget.config(font=("TkDefaultFont", self.font_size))
+        for tab in self.tabs.values():
+            tab.text_widget.config(font=("TkDefaultFont", self.font_size))
+            self.style_manager.configure_tags(tab.text_widget, self.font_size)
 
     def decrease_font_size(self):
         self.font_size = max(8, self.font_size - 2)  # floor font size at 8
-        self.text_widget.config(font=("TkDefaultFont", self.font_size))
+        for tab in self.tabs.values():
+            tab.text_widget.config(font=("TkDefaultFont", self.font_size))
+            self.style_manager.configure_tags(tab.text_widget, self.font_size)
 
     def story_info(self):
         if self.story_info_open:
             return
 
         self.buttons['info'].disable()
+        tab = self.story_info_tab = self.tab
         popup = tk.Toplevel(self.root)
-        popup.title("Story Information")
+        popup.title(f"Story Information - {tab.title}")
 
         # Memory Entry
         tk.Label(popup, text="Memory:").pack(anchor='w')
         self.memory_entry = scrolledtext.ScrolledText(popup, wrap='word', width=50, height=10)
         self.memory_entry.pack(fill='x', padx=10, pady=5)
-        self.memory_entry.insert(tk.END, getattr(self, 'memory_text', ''))
+        self.memory_entry.insert(tk.END, tab.memory_text)
 
         # Author Notes Entry
         tk.Label(popup, text="Author Notes:").pack(anchor='w')
         self.authornotes_entry = scrolledtext.ScrolledText(popup, wrap='word', width=50, height=10)
         self.authornotes_entry.pack(fill='x', padx=10, pady=5)
-        self.authornotes_entry.insert(tk.END, getattr(self, 'author_notes_text', ''))
+        self.authornotes_entry.insert(tk.END, tab.author_notes_text)
 
         # Lorebook Entries
         tk.Label(popup, text="Lorebook Entries:").pack(anchor='w')
-        lorebook_canvas = tk.Canvas(popup)
-        lorebook_canvas.pack(side='left', fill='both', expand=True)
-        scrollbar = ttk.Scrollbar(popup, orient="vertical", command=lorebook_canvas.yview)
-        scrollbar.pack(side='right', fill='y')
-        self.lorebook_frame = tk.Frame(lorebook_canvas)
-        lorebook_canvas.create_window((0, 0), window=self.lorebook_frame, anchor='nw')
-        lorebook_canvas.configure(yscrollcommand=scrollbar.set)
-        self.add_lorebook_button = tk.Button(popup, text="New Entry", command=self.add_lorebook_entry)
-        self.add_lorebook_button.pack(pady=10)
-        self.lorebook_entries_widgets = []
-        self.load_lorebook_entries()
+        self.lorebook_editor = LorebookEditor(popup, tab.lorebook_entries_data)
 
         # Add Context Viewer button at the bottom
         button_frame = tk.Frame(popup)
@@ -720,67 +1331,147 @@ class TextGeneratorApp:
         self.context_viewer_button = Button(button_frame, "Show Context", self.show_context_viewer, side='left')
 
         popup.protocol("WM_DELETE_WINDOW", lambda: self.save_story_info(popup))
-        self.lorebook_frame.bind("<Configure>", lambda e: lorebook_canvas.configure(scrollregion=lorebook_canvas.bbox("all")))
         self.story_info_open = True
 
-    def add_lorebook_entry(self):
-        entry_id = len(self.lorebook_entries_widgets) + 1
-        entry_frame = tk.Frame(self.lorebook_frame)
-        entry_frame.pack(fill='x', pady=5)
-
-        tk.Label(entry_frame, text=f"Entry #{entry_id}").pack(anchor='w')
-
-        tk.Label(entry_frame, text="Name:").pack(anchor='w')
-        name_entry = scrolledtext.ScrolledText(entry_frame, wrap='word', width=50, height=2)
-        name_entry.pack(fill='x', padx=10, pady=5)
-
-        tk.Label(entry_frame, text="Content:").pack(anchor='w')
-        content_entry = scrolledtext.ScrolledText(entry_frame, wrap='word', width=50, height=10)
-        content_entry.pack(fill='x', padx=10, pady=5)
-
-        self.lorebook_entries_widgets.append((entry_frame, name_entry, content_entry))
-
-    def load_lorebook_entries(self):
-        self.lorebook_entries_widgets = []
-        if hasattr(self, 'lorebook_entries_data'):
-            for idx, (name, content) in enumerate(self.lorebook_entries_data.items(), start=1):
-                entry_frame = tk.Frame(self.lorebook_frame)
-                entry_frame.pack(fill='x', pady=5)
-
-                tk.Label(entry_frame, text=f"Entry #{idx}").pack(anchor='w')
-
-                tk.Label(entry_frame, text="Name:").pack(anchor='w')
-                name_entry = scrolledtext.ScrolledText(entry_frame, wrap='word', width=50, height=2)
-                name_entry.pack(fill='x', padx=10, pady=5)
-                name_entry.insert(tk.END, name)
-
-                tk.Label(entry_frame, text="Content:").pack(anchor='w')
-                content_entry = scrolledtext.ScrolledText(entry_frame, wrap='word', width=50, height=10)
-                content_entry.pack(fill='x', padx=10, pady=5)
-                content_entry.insert(tk.END, content)
-
-                self.lorebook_entries_widgets.append((entry_frame, name_entry, content_entry))
+    def apply_lorebook_edits(self, tab):
+        """Copy the lorebook editor's edits into the tab and remember which entries the next save must write."""
+        names = self.lorebook_editor.apply_to(tab.lorebook_entries_data)
+        if names is None or tab.lorebook_changes is None:
+            tab.lorebook_changes = None
+        else:
+            tab.lorebook_changes |= names
 
     def save_story_info(self, popup):
-        self.memory_text = self.memory_entry.get("1.0", tk.END).strip()
-        self.author_notes_text = self.authornotes_entry.get("1.0", tk.END).strip()
+        tab = self.story_info_tab
+        tab.memory_text = self.memory_entry.get("1.0", tk.END).strip()
+        tab.author_notes_text = self.authornotes_entry.get("1.0", tk.END).strip()
 
-        self.lorebook_entries_data = {}
-        for _, name_entry, content_entry in self.lorebook_entries_widgets:
-            name = name_entry.get("1.0", tk.END).strip()
-            content = content_entry.get("1.0", tk.END).strip()
-            if name and content:
-                self.lorebook_entries_data[name] = content
+        self.apply_lorebook_edits(tab)
+        self.lorebook_editor = None
+        tab.context_sections = tab.completion_prefix = None
+        if tab.highlighter is not None:
+            tab.highlighter.set_keywords(tab.lorebook_entries_data)
 
-        self.save_session()
+        self.save_session(tab)
         popup.destroy()
         self.buttons['info'].enable()
         self.story_info_open = False
+        self.story_info_tab = None
+
+    def story_browser(self):
+        if self.story_browser_open:
+            return
+
+        self.buttons['stories'].disable()
+        popup = tk.Toplevel(self.root)
+        popup.title("Stories")
+        popup.geometry("500x400")
+
+        tk.Label(popup, text="Search:").pack(anchor='w', padx=10)
+        search_var = tk.StringVar()
+        search_entry = tk.Entry(popup, textvariable=search_var)
+        search_entry.pack(fill='x', padx=10, pady=5)
+
+        story_list = tk.Listbox(popup)
+        story_list.pack(fill='both', expand=True, padx=10, pady=5)
+        listed_ids = []  # story id for each listbox row
+        pending_search = []
+
+        def refresh():
+            pending_search.clear()
+            story_list.delete(0, tk.END)
+            listed_ids.clear()
+            query = search_var.get().strip()
+            if query:
+                for story_id, title, where, snippet in self.store.search(query):
+                    location = "" if where == 'text' else f" [lorebook: {where}]"
+                    story_list.insert(tk.END, f"{title}{location}: {' '.join(snippet.split())}")
+                    listed_ids.append(story_id)
+            else:
+                open_ids = {tab.story_id for tab in self.tabs.values()}
+                for story_id, title, _ in self.store.list_stories():
+                    marker = " (open)" if story_id in open_ids else ""
+                    story_list.insert(tk.END, f"{title}{marker}")
+                    listed_ids.append(story_id)
+
+        def schedule_refresh(event=None):
+            # Debounce so searching runs once the user pauses typing
+            for after_id in pending_search:
+                popup.after_cancel(after_id)
+            pending_search[:] = [popup.after(150, refresh)]
+
+        def selected_id():
+            selection = story_list.curselection()
+            return listed_ids[selection[0]] if selection else None
+
+        def open_story(event=None):
+            story_id = selected_id()
+            if story_id is not None:
+                self.open_story(story_id)
+                refresh()
+
+        def new_story():
+            title = simpledialog.askstring("New Story", "Enter a title for the new story:", parent=popup)
+            if title:
+                self.open_story(self.store.create_story(title))
+                refresh()
+
+        def rename_story():
+            story_id = selected_id()
+            if story_id is None:
+                return
+            title = simpledialog.askstring("Rename Story", "Enter a new title:", parent=popup)
+            if title:
+                self.store.rename_story(story_id, title)
+                for tab in self.tabs.values():
+                    if tab.story_id == story_id:
+                        tab.title = title
+                        self.update_generation_controls(tab)
+                if story_id == self.tab.story_id:
+                    self.root.title(f"AI Writing Notebook UI - {title}")
+                refresh()
+
+        def delete_story():
+            story_id = selected_id()
+            if story_id is None:
+                return
+            if any(tab.story_id == story_id for tab in self.tabs.values()):
+                messagebox.showerror("Error", "Close this story's tab before deleting it.", parent=popup)
+                return
+            if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this story?", parent=popup):
+                self.store.delete_story(story_id)
+                refresh()
+
+        def close():
+            popup.destroy()
+            self.buttons['stories'].enable()
+            self.story_browser_open = False
+
+        search_entry.bind("<KeyRelease>", schedule_refresh)
+        story_list.bind("<Double-Button-1>", open_story)
+
+        button_frame = tk.Frame(popup)
+        button_frame.pack(fill='x', side='bottom', padx=10, pady=10)
+        Button(button_frame, "Open", open_story, side='left')
+        Button(button_frame, "New", new_story, side='left')
+        Button(button_frame, "Rename", rename_story, side='left')
+        Button(button_frame, "Delete", delete_story, side='left')
+
+        popup.protocol("WM_DELETE_WINDOW", close)
+        refresh()
+        self.story_browser_open = True
 
     def show_markdown_viewer(self):
-        text = self.text_widget.get("1.0", tk.END).strip()
+        self.tab.autocomplete.clear()
+        text = self.tab.document.text().strip()
         show_markdown_viewer(self.root, text)
 
+    def show_find_replace(self):
+        if self.find_dialog is not None:
+            self.find_dialog.popup.lift()
+            return
+        self.find_dialog = FindReplaceDialog(self)
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = TextGeneratorApp(root)
@@ -0,0 +1,130 @@
+import asyncio,time
+from contextlib import aclosing
+import aiohttp
+
+from rate_limiter import all_limiters
+from service_loop import PRIORITY_BACKGROUND
+
+PROBE_PROMPT = "The old lighthouse keeper climbed the stairs and"
+PROBE_MAX_TOKENS = 16
+# Length of a typical generation, used to weigh time-to-first-token against streaming speed
+REFERENCE_TOKENS = 200
+
+class ModelStats:
+    """Exponentially decayed time-to-first-token and tokens/sec of one model."""
+    def __init__(self, ttft=None, tokens_per_second=None, samples=0, updated_at=0.0):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.samples = samples
+        self.updated_at = updated_at
+
+    def record(self, ttft, tokens_per_second, decay):
+        """Blend in a measurement; decay is the weight of the new sample."""
+        if self.samples == 0:
+            self.ttft, self.tokens_per_second = ttft, tokens_per_second
+        else:
+            self.ttft += decay * (ttft - self.ttft)
+            if tokens_per_second is not None:
+                if self.tokens_per_second is None:
+                    self.tokens_per_second = tokens_per_second
+                else:
+                    self.tokens_per_second += decay * (tokens_per_second - self.tokens_per_second)
+        self.samples += 1
+        self.updated_at = time.time()
+
+    def expected_seconds(self):
+        """Estimated time for a REFERENCE_TOKENS generation, None when unmeasured."""
+        if self.ttft is None:
+            return None
+        if not self.tokens_per_second:
+            return self.ttft
+        return self.ttft + REFERENCE_TOKENS / self.tokens_per_second
+
+    def describe(self):
+        if self.ttft is None:
+            return "not measured yet"
+        speed = f", {self.tokens_per_second:.0f} tok/s" if self.tokens_per_second else ""
+        return f"first token {self.ttft:.1f}s{speed}"
+
+def rank_models_by_speed(models, stats):
+    """Measured models fastest first, then the unmeasured ones in their given order."""
+    def key(indexed):
+        index, model = indexed
+        expected = stats[model].expected_seconds() if model in stats else None
+        return (expected is None, expected or 0.0, index)
+    return [model for _, model in sorted(enumerate(models), key=key)]
+
+class ModelProber:
+    """
+    Measures models in the background with tiny completions, so the dropdown can rank them by speed.
+
+    Every interval a few of the models least recently measured are probed one after another at
+    background priority. A round is skipped while any backend limiter has queued or paused work or
+    a story is generating, so probes never compete with real requests. Results are persisted in
+    the workspace.
+    """
+    def __init__(self, app, interval=600, models_per_round=2, decay=0.3):
+        self.app = app
+        self.interval = interval
+        self.models_per_round = models_per_round
+        self.decay = decay
+        self.stats = {model: ModelStats(*values) for model, values in app.store.get_model_stats().items()}
+        self.job = None
+
+    def start(self):
+        self.app.root.after(self.interval * 1000, self.probe_round)
+
+    def busy(self):
+        if any(tab.generating for tab in self.app.tabs.values()):
+            return True
+        return any(stats['queue_depth'] or stats['blocked_for'] > 0
+                   for stats in (limiter.stats() for limiter in all_limiters()))
+
+    def probe_round(self):
+        self.app.root.after(self.interval * 1000, self.probe_round)
+        if (self.job is not None and not self.job.done()) or self.busy():
+            return
+        models = self.app.router.model_names()
+        oldest = sorted(models, key=lambda model: self.stats[model].updated_at if model in self.stats else 0.0)
+        sample = oldest[:self.models_per_round]
+        if sample:
+            self.job = self.app.service.submit(lambda session: self.probe(session, sample), PRIORITY_BACKGROUND,
+                                               on_error=lambda e: print(f"Model probing stopped: {e}"))
+
+    async def probe(self, session, models):
+        for model in models:
+            data = {
+                "model": model,
+                "prompt": PROBE_PROMPT,
+                "stream": True,
+                "max_tokens": PROBE_MAX_TOKENS,
+                "temperature": 0,
+            }
+            start = time.perf_counter()
+            first = None
+            chunks = 0
+            completion_tokens = None
+            try:
+                async with aclosing(self.app.open_completion_stream(session, data, PRIORITY_BACKGROUND)) as stream:
+                    async for payload in stream:
+                        if (payload.get('choices') or [{}])[0].get('text'):
+                            if first is None:
+                                first = time.perf_counter()  # role-only or empty payloads are not a token
+                            chunks += 1
+                        completion_tokens = (payload.get('usage') or {}).get('completion_tokens', completion_tokens)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Probe of {model} failed: {e}")
+                continue
+            if first is None:
+                continue
+            end = time.perf_counter()
+            tokens = completion_tokens or chunks
+            # The first token is part of the TTFT, the rest measure streaming speed
+            tokens_per_second = (tokens - 1) / (end - first) if tokens > 1 and end > first else None
+            self.app.bridge.post(self.record, model, first - start, tokens_per_second)
+
+    def record(self, model, ttft, tokens_per_second):
+        stats = self.stats.setdefault(model, ModelStats())
+        stats.record(ttft, tokens_per_second, self.decay)
+        self.app.store.save_model_stats(model, stats.ttft, stats.tokens_per_second, stats.samples, stats.updated_at)
+        self.app.on_model_stats_changed()
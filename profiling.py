@@ -0,0 +1,142 @@
+import cProfile,functools,threading
+import sys,time,traceback,tracemalloc
+from collections import Counter
+
+# Spans and the watchdog only record anything once developer mode turns this on
+enabled = False
+# Spans slower than this are printed as they happen
+SPAN_LOG_THRESHOLD_MS = 50
+
+span_stats = {}  # name -> [calls, total_ms, max_ms]
+
+def timed(name):
+    """Decorator recording how long each call takes while developer mode is enabled."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                stats = span_stats.setdefault(name, [0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+                if elapsed >= SPAN_LOG_THRESHOLD_MS:
+                    print(f"[span] {name} took {elapsed:.1f} ms")
+        return wrapper
+    return decorator
+
+def format_span_stats():
+    lines = [f"{'span':<28}{'calls':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}"]
+    for name, (calls, total, worst) in sorted(span_stats.items(), key=lambda item: -item[1][1]):
+        lines.append(f"{name:<28}{calls:>8}{total:>12.1f}{total / calls:>10.2f}{worst:>10.1f}")
+    return "\n".join(lines)
+
+class LagMonitor:
+    """
+    Measures how late root.after callbacks run and reports what the Tk thread was doing during stalls.
+
+    A heartbeat is scheduled every interval_ms. A watchdog thread notices when the heartbeat is overdue
+    by more than threshold_ms and prints the main thread's current stack, which points at the callback
+    that is blocking the event loop. The same thread can sample stacks into a flamegraph profile.
+    """
+    def __init__(self, root, interval_ms=100, threshold_ms=250):
+        self.root = root
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.main_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.expected = self.last_beat + self.interval
+        self.max_lag = 0.0
+        self.stall_reported = False
+        self.samples = None  # Counter of folded stacks while sampling
+        self.running = True
+        self.root.after(interval_ms, self.beat)
+        threading.Thread(target=self.watch, name="lag-watchdog", daemon=True).start()
+
+    def beat(self):
+        now = time.monotonic()
+        lag = now - self.expected
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.threshold:
+            print(f"[lag] Tk event loop was blocked for {lag * 1000:.0f} ms")
+        self.last_beat = now
+        self.expected = now + self.interval
+        self.stall_reported = False
+        if self.running:
+            self.root.after(int(self.interval * 1000), self.beat)
+
+    def main_stack(self):
+        frame = sys._current_frames().get(self.main_thread_id)
+        return traceback.extract_stack(frame) if frame else []
+
+    def watch(self):
+        while self.running:
+            time.sleep(self.interval / 2)
+            overdue = time.monotonic() - self.expected
+            if overdue > self.threshold and not self.stall_reported:
+                self.stall_reported = True
+                print(f"[lag] Tk event loop stalled for over {overdue * 1000:.0f} ms, main thread is in:")
+                print("".join(traceback.format_list(self.main_stack())))
+            samples = self.samples  # stop_sampling may reset it from the Tk thread meanwhile
+            if samples is not None:
+                stack = self.main_stack()
+                if stack:
+                    samples[";".join(f"{entry.name} ({entry.filename}:{entry.lineno})" for entry in stack)] += 1
+
+    def start_sampling(self):
+        self.samples = Counter()
+
+    def stop_sampling(self, path):
+        """Write sampled stacks in the folded format read by flamegraph.pl and speedscope."""
+        samples, self.samples = self.samples, None
+        samples = Counter(dict(samples))  # the watchdog may still add its last sample to the old counter
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def stop(self):
+        self.running = False
+
+class ProfileSession:
+    """On-demand cProfile and tracemalloc captures, written to standard formats."""
+    def __init__(self):
+        self.profiler = None
+
+    @property
+    def profiling(self):
+        return self.profiler is not None
+
+    def start_cpu(self):
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def stop_cpu(self, path):
+        """Dump pstats data, readable with pstats, snakeviz or gprof2dot."""
+        self.profiler.disable()
+        self.profiler.dump_stats(path)
+        self.profiler = None
+        return path
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start_memory(self, frames=25):
+        tracemalloc.start(frames)
+
+    def stop_memory(self, path, limit=30):
+        """Dump a tracemalloc snapshot plus a readable summary of the biggest allocation sites."""
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        snapshot.dump(path)
+        summary_path = path + ".txt"
+        with open(summary_path, "w", encoding="utf-8") as f:
+            for stat in snapshot.statistics("lineno")[:limit]:
+                f.write(f"{stat}\n")
+        return summary_path
@@ -0,0 +1,109 @@
+import re
+
+# Rough average for English text with BPE tokenizers, used only for reporting
+CHARS_PER_TOKEN = 4
+
+def format_lorebook(lorebook_entries, order=None):
+    """Render lorebook entries as numbered blocks, skipping entries without a name or content."""
+    names = order if order is not None else list(lorebook_entries)
+    return "\n".join(
+        f"Entry {idx+1}: {name}\n{lorebook_entries[name]}"
+        for idx, name in enumerate(names)
+        if name and lorebook_entries.get(name)
+    )
+
+def build_classic_prompt(prompt, memory_text, author_notes_text, lorebook_entries, summary_text="", retrieved_text=""):
+    """
+    Prepares the final prompt by integrating memory text, author notes, and lorebook entries.
+
+    Notes:
+        - Order -> Memory Text -> Lorebook Entries -> Summary -> Retrieved Passages -> Prompt -> Author Notes
+        - Author notes are spliced in before the final sentence of the prompt.
+    """
+    lorebook_text = format_lorebook(lorebook_entries)
+    if retrieved_text:
+        prompt = retrieved_text + "\n" + prompt
+    if summary_text:
+        prompt = summary_text + "\n" + prompt
+
+    # Integrate memory text and lorebook text into the prompt if they are not empty
+    if memory_text:
+        prompt = memory_text + "\n" + lorebook_text + "\n" + prompt
+    elif lorebook_text:
+        prompt = lorebook_text + "\n" + prompt
+
+    # Integrate author notes text into the prompt if it is not empty
+    if author_notes_text:
+        paragraphs = re.split(r'(?<=[.!?])\s+', prompt)
+        if len(paragraphs) > 1:
+            last_two_paragraphs = paragraphs[-2:]
+            rest_of_prompt = paragraphs[:-2]
+            prompt = '\n'.join(rest_of_prompt + [last_two_paragraphs[0], author_notes_text, last_two_paragraphs[1]])
+        else:
+            prompt = '\n'.join([author_notes_text] + paragraphs)
+
+    return prompt
+
+def build_stable_prompt(prompt, memory_text, author_notes_text, lorebook_entries, lorebook_order, summary_text="",
+                        retrieved_text=""):
+    """
+    Prefix-stable variant of build_classic_prompt for backends with prefix (KV) caching.
+
+    Notes:
+        - Order -> Memory Text -> Lorebook Entries (pinned order) -> Summary -> Retrieved Passages -> Prompt
+        - Author notes are spliced in before the last paragraph of the prompt, so the prompt still
+          ends with story text and appending to that paragraph keeps everything before the notes
+          byte-identical to the previous request; only the notes and the last paragraph are re-prefilled.
+        - Retrieved passages change with the recent text, so the story after them is re-prefilled
+          whenever they do.
+    """
+    if author_notes_text:
+        head, _, tail = prompt.rpartition("\n")
+        prompt = "\n".join(part for part in (head, author_notes_text, tail) if part)
+    sections = [memory_text, format_lorebook(lorebook_entries, lorebook_order), summary_text, retrieved_text, prompt]
+    return "\n".join(section for section in sections if section)
+
+def common_prefix_length(a, b, block=4096):
+    """Length of the longest common prefix of two strings, compared block-wise at C speed."""
+    limit = min(len(a), len(b))
+    if a[:limit] == b[:limit]:
+        return limit
+    start = 0
+    while a[start:start + block] == b[start:start + block]:
+        start += block
+    for idx in range(start, min(start + block, limit)):
+        if a[idx] != b[idx]:
+            return idx
+    return limit
+
+class PromptAssembler:
+    """
+    Builds prompts for one story and tracks how much of each request matches the previous one.
+
+    In stable mode lorebook entries keep the order in which they were first seen, so adding or
+    re-saving entries never reorders the ones already in the server's prefix cache.
+    """
+    def __init__(self, stable=False):
+        self.stable = stable
+        self.lorebook_order = []
+        self.last_request = ""
+
+    def pin_lorebook_order(self, lorebook_entries):
+        known = set(self.lorebook_order)
+        self.lorebook_order = [name for name in self.lorebook_order if name in lorebook_entries]
+        self.lorebook_order += [name for name in lorebook_entries if name not in known]
+        return self.lorebook_order
+
+    def assemble(self, prompt, memory_text, author_notes_text, lorebook_entries, summary_text="", retrieved_text=""):
+        if not self.stable:
+            return build_classic_prompt(prompt, memory_text, author_notes_text, lorebook_entries, summary_text,
+                                        retrieved_text)
+        order = self.pin_lorebook_order(lorebook_entries)
+        return build_stable_prompt(prompt, memory_text, author_notes_text, lorebook_entries, order, summary_text,
+                                   retrieved_text)
+
+    def record_request(self, prompt):
+        """Remember the prompt actually sent and return (matching chars, estimated matching tokens)."""
+        matched = common_prefix_length(self.last_request, prompt)
+        self.last_request = prompt
+        return matched, matched // CHARS_PER_TOKEN
@@ -0,0 +1,161 @@
+import asyncio,heapq,itertools
+import random,time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from service_loop import PRIORITY_DEFAULT
+
+# How many times a request answered with 429 is retried before the error is surfaced
+RATE_LIMIT_RETRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+class RateLimiter:
+    """
+    Token bucket plus concurrency cap shared by every request that uses one backend and key.
+
+    Waiters are admitted by priority, so an interactive generation overtakes queued grammar checks,
+    TTS chunks and model fetches. A 429 response blocks the whole bucket until Retry-After (or a
+    jittered exponential backoff) has passed, instead of letting every caller retry on its own.
+    """
+    def __init__(self, name, requests_per_minute=60, max_concurrency=4):
+        self.name = name
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, requests_per_minute / 6.0)  # allow short bursts of 10 seconds' worth
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.waiters = []  # heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+        self._timer = None
+        self.blocked_until = 0.0
+        self.backoff_attempts = 0
+        self.last_wait = 0.0
+        self.total_wait = 0.0
+        self.admitted = 0
+
+    @property
+    def queue_depth(self):
+        return sum(1 for _, _, future in self.waiters if not future.done())
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "active": self.active,
+            "last_wait": self.last_wait,
+            "mean_wait": self.total_wait / self.admitted if self.admitted else 0.0,
+            "blocked_for": max(0.0, self.blocked_until - time.monotonic()),
+        }
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _wake(self):
+        now = time.monotonic()
+        self._refill(now)
+        while self.waiters and self.active < self.max_concurrency:
+            if self.waiters[0][2].done():  # cancelled while queued
+                heapq.heappop(self.waiters)
+                continue
+            if now < self.blocked_until:
+                self._schedule(self.blocked_until - now)
+                return
+            if self.tokens < 1:
+                self._schedule((1 - self.tokens) / self.rate)
+                return
+            _, _, future = heapq.heappop(self.waiters)
+            self.tokens -= 1
+            self.active += 1
+            future.set_result(None)
+
+    def _schedule(self, delay):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._wake()
+
+    async def acquire(self, priority=PRIORITY_DEFAULT):
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self._sequence), future))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # admitted just as the caller was cancelled
+            raise
+        self.last_wait = time.monotonic() - start
+        self.total_wait += self.last_wait
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority=PRIORITY_DEFAULT):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def backoff(self, retry_after=None):
+        """Block new requests after a 429 and return the delay chosen."""
+        self.backoff_attempts += 1
+        if retry_after is None:
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.backoff_attempts - 1))
+            delay = random.uniform(delay / 2, delay)  # jitter so parallel callers do not retry in lockstep
+        else:
+            delay = retry_after * random.uniform(1.0, 1.1)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        print(f"{self.name} is rate limited, pausing requests for {delay:.1f}s")
+        return delay
+
+    def reset_backoff(self):
+        self.backoff_attempts = 0
+
+_limiters = {}
+
+def limiter_for(key, name=None, requests_per_minute=60, max_concurrency=4):
+    """Return the limiter shared by everything that talks to key (usually a base URL and API key)."""
+    if key not in _limiters:
+        _limiters[key] = RateLimiter(name or str(key), requests_per_minute, max_concurrency)
+    return _limiters[key]
+
+def all_limiters():
+    return list(_limiters.values())
+
+def retry_after_seconds(response):
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+async def send_limited(session, limiter, priority, method, url, read, **kwargs):
+    """
+    Send one non-streaming request through limiter, retrying 429 responses with backoff.
+
+    read(response) is awaited to consume the body while the response is still open.
+    """
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        async with limiter.slot(priority):
+            async with session.request(method, url, **kwargs) as response:
+                if response.status == 429 and attempt < RATE_LIMIT_RETRIES:
+                    limiter.backoff(retry_after_seconds(response))
+                    continue
+                response.raise_for_status()
+                limiter.reset_backoff()
+                return await read(response)
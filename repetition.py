@@ -0,0 +1,131 @@
+from collections import deque
+
+HASH_BASE = 1_000_003
+HASH_MODULUS = (1 << 61) - 1
+
+class RepetitionDetector:
+    """
+    Watches streamed text for runaway generations and reports where the repetition started.
+
+    Three checks run on every character with a fixed amount of state:
+        - Character loops: for every period up to max_period, the length of the current run of
+          characters equal to the one a period earlier. A run covering period_repeats - 1 periods
+          (and at least min_loop_chars) means the last period has been repeated. Periods without a
+          letter or digit, such as "-----" dividers, are not loops.
+        - Word loops: a rolling hash of the last ngram words and the word count at which each hash
+          was last seen, within ngram_window words. The text is looping when consecutive n-grams all
+          recur at the same distance for ngram_repeats - 1 back-to-back copies of that distance, so
+          a chorus that comes back between verses is not one.
+        - Whitespace: a run of more than max_whitespace whitespace characters.
+
+    feed() returns the number of characters to keep, everything after is the repeated tail; it is
+    also left in keep, with a description of the loop in reason.
+    """
+    def __init__(self, ngram=8, ngram_repeats=3, ngram_window=400, max_period=64, period_repeats=3,
+                 min_loop_chars=100, max_whitespace=40):
+        self.ngram = ngram
+        self.ngram_repeats = ngram_repeats
+        self.ngram_window = ngram_window
+        self.max_period = max_period
+        self.period_repeats = period_repeats
+        self.min_loop_chars = min_loop_chars
+        self.max_whitespace = max_whitespace
+        self.length = 0  # characters fed so far
+        self.keep = None
+        self.reason = None
+        self.recent = deque(maxlen=max_period)  # last max_period characters, newest last
+        self.runs = [0] * (max_period + 1)  # runs[p]: trailing characters equal to the one p earlier
+        self.last_alnum = -1  # position of the last letter or digit
+        self.whitespace_run = 0
+        self.word = []
+        self.word_start = 0
+        self.words = deque(maxlen=ngram)  # (word hash, start offset) of the last ngram words
+        self.ngram_hash = 0
+        self.top_power = pow(HASH_BASE, ngram - 1, HASH_MODULUS)
+        self.word_count = 0
+        self.seen = {}  # n-gram hash -> word count at its last occurrence, within ngram_window
+        self.history = deque()  # (n-gram hash, word count) in order, to expire entries of seen
+        self.gap = 0  # distance in words at which the trailing n-grams recur
+        self.gap_run = 0  # consecutive n-grams recurring at that distance
+        self.gap_start = 0  # start offset of the first n-gram of that run
+
+    def feed(self, chunk):
+        """Process a chunk and return the length of text to keep when a loop was found, else None."""
+        for char in chunk:
+            keep = self.feed_char(char)
+            if keep is not None:
+                self.keep = keep
+                return keep
+        return None
+
+    def feed_char(self, char):
+        position = self.length
+        self.length += 1
+
+        if char.isspace():
+            self.whitespace_run += 1
+            if self.whitespace_run > self.max_whitespace:
+                self.reason = "whitespace"
+                return position + 1 - self.whitespace_run
+        else:
+            self.whitespace_run = 0
+
+        if char.isalnum():
+            self.last_alnum = position
+
+        # recent[-p] is the character p positions back
+        recent = self.recent
+        runs = self.runs
+        for period in range(1, len(recent) + 1):
+            if recent[-period] == char:
+                run = runs[period] = runs[period] + 1
+                if (run >= self.min_loop_chars and run >= period * (self.period_repeats - 1)
+                        and position - self.last_alnum < period):
+                    self.reason = f"{period}-character loop"
+                    # The run started one period after the first copy, keep that copy only
+                    return self.length - run
+            else:
+                runs[period] = 0
+        recent.append(char)
+
+        if char.isalnum():
+            if not self.word:
+                self.word_start = position
+            self.word.append(char)
+        elif self.word:
+            return self.end_word()
+        return None
+
+    def end_word(self):
+        word_hash = hash("".join(self.word).lower()) % HASH_MODULUS
+        self.word = []
+        if len(self.words) == self.ngram:
+            self.ngram_hash = (self.ngram_hash - self.words[0][0] * self.top_power) % HASH_MODULUS
+        self.ngram_hash = (self.ngram_hash * HASH_BASE + word_hash) % HASH_MODULUS
+        self.words.append((word_hash, self.word_start))
+        self.word_count += 1
+        if len(self.words) < self.ngram:
+            return None
+
+        word_count = self.word_count
+        history = self.history
+        while history and word_count - history[0][1] > self.ngram_window:
+            expired, seen_at = history.popleft()
+            if self.seen.get(expired) == seen_at:
+                del self.seen[expired]
+        last_seen = self.seen.get(self.ngram_hash)
+        self.seen[self.ngram_hash] = word_count
+        history.append((self.ngram_hash, word_count))
+
+        gap = word_count - last_seen if last_seen is not None else 0
+        if not gap:
+            self.gap = self.gap_run = 0
+            return None
+        if gap != self.gap:
+            self.gap, self.gap_run, self.gap_start = gap, 0, self.words[0][1]
+        self.gap_run += 1
+        repeated_words = self.gap_run + self.ngram - 1
+        if repeated_words >= max(gap, self.ngram) * (self.ngram_repeats - 1):
+            self.reason = f"repeated {gap}-word sequence"
+            return self.gap_start
+        return None
@@ -0,0 +1,209 @@
+import heapq,math,re,zlib
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # hashed vectors are optional, BM25 alone still ranks passages
+    np = None
+
+from prompt_builder import CHARS_PER_TOKEN
+from summarizer import content_hash, split_chunks
+
+RETRIEVAL_HEADER = "Relevant earlier passages:"
+WORD_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset("a an and are as at be but by for from had has have he her him his i in is it its me my "
+                      "not of on or our she so that the their them then there they this to was we were what "
+                      "when with you your".split())
+VECTOR_DIMENSIONS = 256
+VECTOR_WEIGHT = 0.5  # share of the hashed-vector similarity in a passage's score, BM25 counts 1
+
+def tokenize(text):
+    return [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+def hashed_vector(terms):
+    """
+    Unit-length feature-hashed vector of a text's words and word pairs, or None without NumPy.
+
+    The pairs let passages that share phrasing score higher than ones that only share vocabulary,
+    which BM25 cannot see. crc32 keeps the hashing identical across runs.
+    """
+    if np is None:
+        return None
+    features = Counter(terms)
+    features.update(f"{first} {second}" for first, second in zip(terms, terms[1:]))
+    vector = np.zeros(VECTOR_DIMENSIONS, dtype=np.float32)
+    for feature, count in features.items():
+        hashed = zlib.crc32(feature.encode())
+        vector[hashed % VECTOR_DIMENSIONS] += (1.0 + math.log(count)) * (1 if hashed & 0x80000000 else -1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class Passage:
+    __slots__ = ("key", "source", "text", "label", "position", "terms", "length", "vector")
+
+    def __init__(self, key, source, text, label, position):
+        self.key = key
+        self.source = source  # "story" or "lorebook"
+        self.text = text
+        self.label = label  # lorebook entry name, None for story passages
+        self.position = position  # start offset in the story, or index in the lorebook
+        terms = tokenize(text)
+        self.terms = Counter(terms)
+        self.length = len(terms)
+        self.vector = hashed_vector(terms)
+
+class RetrievalIndex:
+    """
+    Incremental BM25 index over passages, optionally combined with hashed-vector similarity.
+
+    Passages are keyed by (source, content hash), so replacing a source's passages only tokenizes
+    and embeds the ones whose text changed; unchanged passages just get their new position.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.passages = {}
+        self.sources = {}  # source -> set of keys
+        self.postings = {}  # term -> {key: term frequency}
+        self.total_length = 0
+        self._vector_keys = None  # keys of the rows of _vectors, None when passages changed since
+        self._vectors = None
+
+    def __len__(self):
+        return len(self.passages)
+
+    def add(self, passage):
+        self.passages[passage.key] = passage
+        self.sources.setdefault(passage.source, set()).add(passage.key)
+        for term, count in passage.terms.items():
+            self.postings.setdefault(term, {})[passage.key] = count
+        self.total_length += passage.length
+        self._vector_keys = None
+
+    def remove(self, key):
+        passage = self.passages.pop(key)
+        self.sources[passage.source].discard(key)
+        for term in passage.terms:
+            postings = self.postings[term]
+            del postings[key]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= passage.length
+        self._vector_keys = None
+
+    def replace(self, source, items):
+        """Make (text, label, position) items the only passages of source, returning how many were new."""
+        wanted = {}
+        for text, label, position in items:
+            wanted[(source, content_hash(text))] = (text, label, position)
+        for key in self.sources.get(source, set()) - wanted.keys():
+            self.remove(key)
+        added = 0
+        for key, (text, label, position) in wanted.items():
+            passage = self.passages.get(key)
+            if passage is None:
+                self.add(Passage(key, source, text, label, position))
+                added += 1
+            else:
+                passage.label = label
+                passage.position = position
+        return added
+
+    def vector_matrix(self):
+        if self._vector_keys is None:
+            self._vector_keys = list(self.passages)
+            vectors = [self.passages[key].vector for key in self._vector_keys]
+            self._vectors = np.stack(vectors) if vectors else np.zeros((0, VECTOR_DIMENSIONS), dtype=np.float32)
+        return self._vector_keys, self._vectors
+
+    def search(self, query, limit):
+        """The limit best (passage, score) pairs for query, best first."""
+        terms = tokenize(query)
+        if not terms or not self.passages:
+            return []
+        count = len(self.passages)
+        average_length = max(self.total_length / count, 1)
+        scores = {}
+        for term in set(terms):
+            postings = self.postings.get(term)
+            # Terms in most passages barely change the ranking but cost a pass over all of them
+            if not postings or len(postings) > count // 2 + 1:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.passages[key].length / average_length)
+                scores[key] = scores.get(key, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        if scores:
+            best = max(scores.values())
+            scores = {key: score / best for key, score in scores.items()}
+        if np is not None:
+            keys, vectors = self.vector_matrix()
+            similarities = vectors @ hashed_vector(terms)
+            for row in np.flatnonzero(similarities > 0):
+                key = keys[row]
+                scores[key] = scores.get(key, 0.0) + VECTOR_WEIGHT * float(similarities[row])
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(self.passages[key], score) for key, score in best]
+
+class ContextRetriever:
+    """
+    Adds the story passages and lorebook entries most relevant to the recent text to a prompt.
+
+    The story is split into content-defined passages of about passage_chars, so an edit only
+    re-indexes the passages around it. Passages the prompt already contains verbatim are never
+    injected; with a rolling summary or recent_chars those are the passages dropped from the prompt.
+    """
+    def __init__(self, top_k=5, max_tokens=400, recent_chars=0, query_chars=1000, passage_chars=600, lorebook=False):
+        self.top_k = top_k
+        self.max_tokens = max_tokens
+        self.recent_chars = recent_chars
+        self.query_chars = query_chars
+        self.passage_chars = passage_chars
+        self.lorebook = lorebook  # when True, lorebook entries are only sent when retrieved
+        self.index = RetrievalIndex()
+        self._synced_version = None
+        self._synced_lorebook = None
+
+    def sync(self, document, lorebook_entries):
+        """Bring the index up to date with the story and lorebook, skipping whatever did not change."""
+        if document.version != self._synced_version:
+            text = document.text()
+            spans = split_chunks(text, self.passage_chars)
+            tail = spans[-1][1] if spans else 0
+            spans.append((tail, len(text)))  # text after the last boundary is a passage too
+            self.index.replace("story", [(text[start:end].strip(), None, start) for start, end in spans
+                                         if text[start:end].strip()])
+            self._synced_version = document.version
+        if self.lorebook and lorebook_entries != self._synced_lorebook:
+            self.index.replace("lorebook", [(f"{name}\n{content}", name, position)
+                                            for position, (name, content) in enumerate(lorebook_entries.items())
+                                            if name and content])
+            self._synced_lorebook = dict(lorebook_entries)
+
+    def select(self, prompt, lorebook_entries):
+        """
+        Return (retrieved section, prompt, lorebook entries) for a prompt.
+
+        The prompt is cut to its last recent_chars characters when that is set, and the lorebook is
+        narrowed to the retrieved entries when lorebook retrieval is enabled. Retrieved text stays
+        within max_tokens and story passages keep their order in the story.
+        """
+        if self.recent_chars and len(prompt) > self.recent_chars:
+            cut = prompt.find("\n", len(prompt) - self.recent_chars)
+            prompt = prompt[cut + 1:] if cut >= 0 else prompt[-self.recent_chars:]
+        budget = self.max_tokens * CHARS_PER_TOKEN
+        chosen = []
+        for passage, _ in self.index.search(prompt[-self.query_chars:], self.top_k * 3):
+            if len(chosen) == self.top_k:
+                break
+            if len(passage.text) > budget or (passage.source == "story" and passage.text in prompt):
+                continue
+            budget -= len(passage.text)
+            chosen.append(passage)
+        if self.lorebook:
+            names = {passage.label for passage in chosen if passage.source == "lorebook"}
+            lorebook_entries = {name: content for name, content in lorebook_entries.items() if name in names}
+        passages = sorted((passage for passage in chosen if passage.source == "story"), key=lambda passage: passage.position)
+        if not passages:
+            return "", prompt, lorebook_entries
+        return RETRIEVAL_HEADER + "\n" + "\n\n".join(passage.text for passage in passages), prompt, lorebook_entries
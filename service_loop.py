@@ -0,0 +1,170 @@
+import asyncio,threading
+import concurrent.futures
+import itertools,queue,traceback
+import aiohttp
+
+# Lower values are admitted first when the loop is busy
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 5
+PRIORITY_BACKGROUND = 10
+
+class TkBridge:
+    """
+    Marshals callbacks from the service loop thread back onto the Tk main thread.
+
+    Tk widgets must only be touched from the thread running mainloop, so background work
+    posts callbacks into a thread-safe queue that is drained with root.after.
+    """
+    POLL_INTERVAL_MS = 15
+
+    def __init__(self, root):
+        self.root = root
+        self.pending = queue.SimpleQueue()
+        self.root.after(self.POLL_INTERVAL_MS, self.drain)
+
+    def post(self, callback, *args):
+        """Schedule callback(*args) on the Tk thread. Safe to call from any thread."""
+        self.pending.put((callback, args))
+
+    def drain(self):
+        while True:
+            try:
+                callback, args = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception:
+                traceback.print_exc()
+        try:
+            self.root.after(self.POLL_INTERVAL_MS, self.drain)
+        except RuntimeError:
+            pass  # Tk interpreter already destroyed
+
+class Job:
+    """Handle for work submitted to the ServiceLoop. Can be cancelled from any thread."""
+    def __init__(self, service, factory, priority, on_result, on_error):
+        self.service = service
+        self.factory = factory
+        self.priority = priority
+        self.on_result = on_result
+        self.on_error = on_error
+        self.cancelled = False
+        self.task = None
+        self.future = concurrent.futures.Future()
+
+    def cancel(self):
+        self.cancelled = True
+        try:
+            self.service.loop.call_soon_threadsafe(self._cancel_task)
+        except RuntimeError:
+            pass  # loop already closed
+
+    def _cancel_task(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def done(self):
+        return self.future.done()
+
+class ServiceLoop:
+    """
+    One long-lived asyncio loop on a background thread that hosts all network I/O.
+
+    Work is submitted as a coroutine function taking the shared aiohttp session. Jobs wait in a
+    priority queue and are started as soon as one of max_concurrency slots is free, so interactive
+    requests overtake queued background work.
+    """
+    def __init__(self, bridge, max_concurrency=8):
+        self.bridge = bridge
+        self.max_concurrency = max_concurrency
+        self.loop = asyncio.new_event_loop()
+        self.session = None
+        self._sequence = itertools.count()  # keeps FIFO order among equal priorities
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="service-loop", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._startup())
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    async def _startup(self):
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_concurrency * 2))
+        self.queue = asyncio.PriorityQueue()
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        self.dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            await self.slots.acquire()
+            _, _, job = await self.queue.get()
+            if job.cancelled:
+                job.future.cancel()
+                self.slots.release()
+                continue
+            job.task = asyncio.create_task(self._execute(job))
+            # A task cancelled before its first step never enters _execute, so the slot is freed here
+            job.task.add_done_callback(lambda task, job=job: self._finished(job, task))
+
+    def _finished(self, job, task):
+        self.slots.release()
+        if not job.future.done():
+            job.future.cancel()
+
+    async def _execute(self, job):
+        try:
+            result = await job.factory(self.session)
+        except asyncio.CancelledError:
+            job.future.cancel()
+        except Exception as e:
+            job.future.set_exception(e)
+            if job.on_error:
+                self.bridge.post(job.on_error, e)
+            else:
+                traceback.print_exception(e)
+        else:
+            job.future.set_result(result)
+            if job.on_result:
+                self.bridge.post(job.on_result, result)
+
+    def submit(self, factory, priority=PRIORITY_DEFAULT, on_result=None, on_error=None):
+        """
+        Queue factory(session) on the service loop. Safe to call from any thread.
+
+        on_result and on_error are invoked on the Tk thread through the bridge.
+        """
+        job = Job(self, factory, priority, on_result, on_error)
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (priority, next(self._sequence), job))
+        return job
+
+    def call(self, coro, timeout=None):
+        """Run a coroutine on the loop and block the calling thread for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self, timeout=2.0):
+        """Cancel everything in flight, close the HTTP session and join the loop thread within timeout."""
+        if not self._thread.is_alive():
+            return
+        try:
+            self.call(self._shutdown(), timeout)
+        except (concurrent.futures.TimeoutError, RuntimeError) as e:
+            print(f"Service loop did not shut down cleanly: {e!r}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+    async def _shutdown(self):
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.session.close()
@@ -0,0 +1,253 @@
+import os,json,time
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    text TEXT NOT NULL DEFAULT '',
+    memory TEXT NOT NULL DEFAULT '',
+    author_notes TEXT NOT NULL DEFAULT '',
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lorebook (
+    id INTEGER PRIMARY KEY,
+    story_id INTEGER NOT NULL REFERENCES stories(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    content TEXT NOT NULL,
+    UNIQUE (story_id, name)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS summaries (
+    hash TEXT PRIMARY KEY,
+    summary TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS model_stats (
+    model TEXT PRIMARY KEY,
+    ttft REAL,
+    tokens_per_second REAL,
+    samples INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# External-content FTS tables stay in sync through triggers, so story text is stored only once
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS stories_fts USING fts5(title, text, content='stories', content_rowid='id');
+CREATE VIRTUAL TABLE IF NOT EXISTS lorebook_fts USING fts5(name, content, content='lorebook', content_rowid='id');
+
+CREATE TRIGGER IF NOT EXISTS stories_ai AFTER INSERT ON stories BEGIN
+    INSERT INTO stories_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS stories_ad AFTER DELETE ON stories BEGIN
+    INSERT INTO stories_fts(stories_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS stories_au AFTER UPDATE OF title, text ON stories BEGIN
+    INSERT INTO stories_fts(stories_fts, rowid, title, text) VALUES ('delete', old.id, old.title, old.text);
+    INSERT INTO stories_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS lorebook_ai AFTER INSERT ON lorebook BEGIN
+    INSERT INTO lorebook_fts(rowid, name, content) VALUES (new.id, new.name, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS lorebook_ad AFTER DELETE ON lorebook BEGIN
+    INSERT INTO lorebook_fts(lorebook_fts, rowid, name, content) VALUES ('delete', old.id, old.name, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS lorebook_au AFTER UPDATE ON lorebook BEGIN
+    INSERT INTO lorebook_fts(lorebook_fts, rowid, name, content) VALUES ('delete', old.id, old.name, old.content);
+    INSERT INTO lorebook_fts(rowid, name, content) VALUES (new.id, new.name, new.content);
+END;
+"""
+
+class StoryStore:
+    """
+    Workspace of many stories kept in a single SQLite database.
+
+    Only story titles are read when listing; text, memory, author notes and lorebook are loaded
+    per story on demand. Story text and lorebook entries are indexed with FTS5 when available.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            try:
+                self.conn.executescript(FTS_SCHEMA)
+                self.has_fts = True
+            except sqlite3.OperationalError as e:
+                print(f"Full-text search unavailable, falling back to substring search: {e}")
+                self.has_fts = False
+
+    def close(self):
+        self.conn.close()
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT INTO meta(key, value) VALUES (?, ?) "
+                              "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def get_summary(self, content_hash):
+        row = self.conn.execute("SELECT summary FROM summaries WHERE hash = ?", (content_hash,)).fetchone()
+        return row[0] if row else None
+
+    def save_summary(self, content_hash, summary):
+        """Cache the summary of a span of story text under the hash of that text."""
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO summaries(hash, summary) VALUES (?, ?)", (content_hash, summary))
+
+    def get_model_stats(self):
+        """Measured model speeds as {model: (ttft, tokens_per_second, samples, updated_at)}."""
+        rows = self.conn.execute("SELECT model, ttft, tokens_per_second, samples, updated_at FROM model_stats")
+        return {row[0]: row[1:] for row in rows}
+
+    def save_model_stats(self, model, ttft, tokens_per_second, samples, updated_at):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO model_stats(model, ttft, tokens_per_second, samples, updated_at) "
+                              "VALUES (?, ?, ?, ?, ?)", (model, ttft, tokens_per_second, samples, updated_at))
+
+    def list_stories(self):
+        """Return (id, title, updated_at) for every story, most recently edited first."""
+        return self.conn.execute("SELECT id, title, updated_at FROM stories ORDER BY updated_at DESC").fetchall()
+
+    def create_story(self, title, text="", memory="", author_notes="", lorebook_entries=None):
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO stories(title, text, memory, author_notes, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (title, text, memory, author_notes, time.time()))
+            story_id = cursor.lastrowid
+            self._save_lorebook(story_id, lorebook_entries or {})
+        return story_id
+
+    def load_story(self, story_id):
+        row = self.conn.execute("SELECT title, text, memory, author_notes FROM stories WHERE id = ?",
+                                (story_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No story with id {story_id}")
+        lorebook = self.conn.execute("SELECT name, content FROM lorebook WHERE story_id = ? ORDER BY id",
+                                     (story_id,)).fetchall()
+        return {
+            "title": row[0],
+            "text": row[1],
+            "memory": row[2],
+            "author_notes": row[3],
+            "lorebook_entries": dict(lorebook),
+        }
+
+    def save_story(self, story_id, text, memory, author_notes, lorebook_entries, lorebook_changes=None):
+        """
+        Persist a story, only rewriting (and reindexing) the columns and entries that changed.
+
+        Pass text=None when the caller knows the story text is unchanged, and in lorebook_changes the
+        names of the only lorebook entries edited since the last save (None compares every entry).
+        """
+        with self.conn:
+            changed = 0
+            if text is not None:
+                changed += self.conn.execute(
+                    "UPDATE stories SET text = ? WHERE id = ? AND text <> ?", (text, story_id, text)).rowcount
+            changed += self.conn.execute(
+                "UPDATE stories SET memory = ?, author_notes = ? WHERE id = ? AND (memory <> ? OR author_notes <> ?)",
+                (memory, author_notes, story_id, memory, author_notes)).rowcount
+            if lorebook_changes is None:
+                changed += self._save_lorebook(story_id, lorebook_entries)
+            else:
+                changed += self._save_lorebook_entries(story_id, lorebook_entries, lorebook_changes)
+            if changed:
+                self.conn.execute("UPDATE stories SET updated_at = ? WHERE id = ?", (time.time(), story_id))
+
+    def _save_lorebook(self, story_id, lorebook_entries):
+        names = list(lorebook_entries)
+        placeholders = ",".join("?" * len(names))
+        changed = self.conn.execute(
+            f"DELETE FROM lorebook WHERE story_id = ? AND name NOT IN ({placeholders})", (story_id, *names)).rowcount
+        for name, content in lorebook_entries.items():
+            changed += self.conn.execute(
+                "INSERT INTO lorebook(story_id, name, content) VALUES (?, ?, ?) "
+                "ON CONFLICT(story_id, name) DO UPDATE SET content = excluded.content "
+                "WHERE content <> excluded.content", (story_id, name, content)).rowcount
+        return changed
+
+    def _save_lorebook_entries(self, story_id, lorebook_entries, names):
+        """Write or delete just the named entries."""
+        changed = 0
+        for name in names:
+            if name in lorebook_entries:
+                changed += self.conn.execute(
+                    "INSERT INTO lorebook(story_id, name, content) VALUES (?, ?, ?) "
+                    "ON CONFLICT(story_id, name) DO UPDATE SET content = excluded.content "
+                    "WHERE content <> excluded.content", (story_id, name, lorebook_entries[name])).rowcount
+            else:
+                changed += self.conn.execute(
+                    "DELETE FROM lorebook WHERE story_id = ? AND name = ?", (story_id, name)).rowcount
+        return changed
+
+    def rename_story(self, story_id, title):
+        with self.conn:
+            self.conn.execute("UPDATE stories SET title = ? WHERE id = ?", (title, story_id))
+
+    def delete_story(self, story_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM stories WHERE id = ?", (story_id,))
+
+    def search(self, query, limit=50):
+        """
+        Search story text and lorebook entries.
+
+        Returns (story_id, title, where, snippet) tuples, where 'where' is 'text' or the lorebook entry name.
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        if not self.has_fts:
+            return self._search_like(query, limit)
+        # Quote every term so user input is never parsed as FTS syntax
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        results = self.conn.execute(
+            "SELECT s.id, s.title, 'text', snippet(stories_fts, -1, '[', ']', '...', 12) "
+            "FROM stories_fts JOIN stories s ON s.id = stories_fts.rowid "
+            "WHERE stories_fts MATCH ? ORDER BY rank LIMIT ?", (match, limit)).fetchall()
+        results += self.conn.execute(
+            "SELECT s.id, s.title, l.name, snippet(lorebook_fts, 1, '[', ']', '...', 12) "
+            "FROM lorebook_fts JOIN lorebook l ON l.id = lorebook_fts.rowid JOIN stories s ON s.id = l.story_id "
+            "WHERE lorebook_fts MATCH ? ORDER BY rank LIMIT ?", (match, limit)).fetchall()
+        return results
+
+    def _search_like(self, query, limit):
+        pattern = f"%{query}%"
+        results = self.conn.execute(
+            "SELECT id, title, 'text', substr(text, max(instr(text, ?) - 40, 1), 100) FROM stories "
+            "WHERE text LIKE ? OR title LIKE ? LIMIT ?", (query, pattern, pattern, limit)).fetchall()
+        results += self.conn.execute(
+            "SELECT s.id, s.title, l.name, substr(l.content, 1, 100) FROM lorebook l JOIN stories s ON s.id = l.story_id "
+            "WHERE l.content LIKE ? OR l.name LIKE ? LIMIT ?", (pattern, pattern, limit)).fetchall()
+        return results
+
+    def migrate_session_json(self, session_path, title="Session"):
+        """Import a legacy session.json as a story once, then rename it so it is not imported again."""
+        if not os.path.exists(session_path):
+            return None
+        try:
+            with open(session_path, "r") as f:
+                session_data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Could not migrate {session_path}: {e}")
+            return None
+        story_id = self.create_story(
+            title,
+            session_data.get("text", ""),
+            session_data.get("memory", ""),
+            session_data.get("author_notes", ""),
+            session_data.get("lorebook_entries", {}),
+        )
+        os.replace(session_path, session_path + ".migrated")
+        print(f"Migrated {session_path} into the story workspace as '{title}'")
+        return story_id
@@ -0,0 +1,130 @@
+import hashlib,zlib
+from contextlib import aclosing
+
+from service_loop import PRIORITY_BACKGROUND
+
+SUMMARY_PROMPT = ("Summarize the following part of a story in a few sentences. Keep the names, places, "
+                  "relationships and unresolved plot threads a writer would need to continue it.\n\n"
+                  "{text}\n\nSummary:")
+SUMMARY_HEADER = "Summary of earlier chapters:"
+SUMMARY_MAX_TOKENS = 200
+
+def split_chunks(text, chunk_chars, limit=None):
+    """
+    Split text[:limit] into (start, end) chunks that end on line breaks.
+
+    Boundaries are content-defined: a chunk closes after a line whose checksum hits a fixed pattern
+    once it holds at least half of chunk_chars (or unconditionally at twice chunk_chars). An edit
+    therefore only moves the boundaries around it, so the other chunks keep their hash and summary.
+    Text after the last boundary is not part of any chunk.
+    """
+    limit = len(text) if limit is None else limit
+    min_chars, max_chars = chunk_chars // 2, chunk_chars * 2
+    chunks = []
+    start = position = 0
+    while position < limit:
+        newline = text.find("\n", position, limit)
+        if newline < 0:
+            break
+        position = newline + 1
+        size = position - start
+        if size >= max_chars or (size >= min_chars and zlib.crc32(text[max(newline - 64, start):newline].encode()) % 4 == 0):
+            chunks.append((start, position))
+            start = position
+    return chunks
+
+def content_hash(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+class RollingSummarizer:
+    """
+    Replaces older story text in prompts with summaries produced in the background, for one story.
+
+    The last recent_chars characters are always sent verbatim. Older text is split into chunks and
+    each chunk is summarized once, keyed by the hash of its text in the story store, so a summary is
+    only recomputed after that chunk is edited. Every chunk is summarized eventually, oldest first and
+    at most max_chunks per background job; text stays verbatim until its summary exists.
+    """
+    def __init__(self, app, model="", recent_chars=12000, chunk_chars=6000, max_chunks=20):
+        self.app = app
+        self.model = model
+        self.recent_chars = recent_chars
+        self.chunk_chars = chunk_chars
+        self.max_chunks = max_chunks
+        self.summaries = {}  # content hash -> summary or None, read through from the store
+        self.pending = set()
+        self.job = None
+        self._last_text = None
+        self._last_chunks = []
+
+    def chunks(self, text):
+        """All summarizable chunks of text as (start, end, hash), memoized for the last text seen."""
+        if text != self._last_text:
+            spans = split_chunks(text, self.chunk_chars, len(text) - self.recent_chars)
+            self._last_chunks = [(start, end, content_hash(text[start:end])) for start, end in spans]
+            self._last_text = text
+        return self._last_chunks
+
+    def lookup(self, key):
+        if key not in self.summaries:
+            # Misses are cached too, so old chunks that never get a summary are not queried every prompt
+            self.summaries[key] = self.app.store.get_summary(key)
+        return self.summaries[key]
+
+    def condense(self, text):
+        """
+        Return (summary section, remaining text) for a prompt.
+
+        Summaries are used for the longest run of summarized chunks starting at the oldest chunk;
+        everything after that run stays verbatim, so no text is dropped while summaries are pending.
+        """
+        summaries = []
+        covered = 0
+        for start, end, key in self.chunks(text):
+            summary = self.lookup(key)
+            if summary is None:
+                break
+            summaries.append(summary)
+            covered = end
+        if not summaries:
+            return "", text
+        return SUMMARY_HEADER + "\n" + "\n".join(summaries), text[covered:]
+
+    def update(self, text):
+        """Summarize, oldest first, up to max_chunks of the chunks of text that have no summary yet."""
+        if self.job is not None and not self.job.done():
+            return
+        model = self.model or self.app.model_var.get()
+        missing = [(key, text[start:end]) for start, end, key in self.chunks(text)
+                   if key not in self.pending and self.lookup(key) is None][:self.max_chunks]
+        if not missing or not model:
+            return
+        self.pending.update(key for key, _ in missing)
+        self.job = self.app.service.submit(
+            lambda session: self.summarize(session, model, missing), PRIORITY_BACKGROUND,
+            on_result=lambda _: self.pending.clear(), on_error=self.on_error)
+
+    def on_error(self, error):
+        print(f"Background summarization stopped: {error}")
+        self.pending.clear()
+
+    async def summarize(self, session, model, chunks):
+        for key, chunk in chunks:
+            data = {
+                "model": model,
+                "prompt": SUMMARY_PROMPT.format(text=chunk.strip()),
+                "stream": True,
+                "max_tokens": SUMMARY_MAX_TOKENS,
+                "temperature": 0.3,
+            }
+            parts = []
+            async with aclosing(self.app.open_completion_stream(session, data, PRIORITY_BACKGROUND)) as stream:
+                async for payload in stream:
+                    parts.append(payload.get('choices', [{}])[0].get('text') or "")
+            summary = "".join(parts).strip()
+            if summary:
+                self.app.bridge.post(self.store_summary, key, summary)
+
+    def store_summary(self, key, summary):
+        self.summaries[key] = summary
+        self.app.store.save_summary(key, summary)
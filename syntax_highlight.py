@@ -0,0 +1,110 @@
+import re
+
+HIGHLIGHT_TAGS = ("dialogue", "md_heading", "md_strong", "md_emphasis", "lore_mention")
+
+HEADING_PATTERN = re.compile(r"#{1,6}\s")
+DIALOGUE_PATTERN = re.compile(r'"[^"\n]*"|“[^”\n]*”')
+STRONG_PATTERN = re.compile(r"\*\*[^*\n]+\*\*|__[^_\n]+__")
+EMPHASIS_PATTERN = re.compile(r"(?<![*\w])\*[^*\n]+\*(?![*\w])|(?<![_\w])_[^_\n]+_(?![_\w])")
+WORD_PATTERN = re.compile(r"\w+")
+
+def keyword_key(name):
+    """Lowercased words of a lorebook entry name, so "Mr. Smith" also matches "mr smith"."""
+    return " ".join(WORD_PATTERN.findall(name.lower()))
+
+def line_spans(line, keywords=frozenset(), max_keyword_words=0):
+    """(tag, start column, end column) spans of one line of the editor."""
+    if HEADING_PATTERN.match(line):
+        return [("md_heading", 0, len(line))]
+    spans = [(tag, match.start(), match.end())
+             for tag, pattern in (("dialogue", DIALOGUE_PATTERN), ("md_strong", STRONG_PATTERN), ("md_emphasis", EMPHASIS_PATTERN))
+             for match in pattern.finditer(line)]
+    if keywords:
+        words = list(WORD_PATTERN.finditer(line))
+        lowered = [word.group().lower() for word in words]
+        position = 0
+        while position < len(words):
+            # Longest entry name starting at this word wins
+            for count in range(min(max_keyword_words, len(words) - position), 0, -1):
+                if " ".join(lowered[position:position + count]) in keywords:
+                    spans.append(("lore_mention", words[position].start(), words[position + count - 1].end()))
+                    position += count - 1
+                    break
+            position += 1
+    return spans
+
+class SyntaxHighlighter:
+    """
+    Highlights dialogue, Markdown emphasis and headings, and lorebook entry names in an editor.
+
+    Only the lines in view plus margin_lines above and below are tagged. Every document line has a
+    flag telling whether its tags are current; edits reset the flags of the lines they touched, so
+    typing or streaming re-tokenizes just those lines, and scrolling only tags lines not seen yet.
+    Refreshes are debounced to one per delay_ms.
+    """
+    def __init__(self, widget, document, margin_lines=50, delay_ms=50):
+        self.widget = widget
+        self.document = document
+        self.margin_lines = margin_lines
+        self.delay_ms = delay_ms
+        self.keywords = frozenset()
+        self.max_keyword_words = 0
+        self.current = [False] * len(document.lines)  # per line: tags match its text
+        self.pending = None  # after() id of the next refresh
+
+        document.on_edit = self.on_edit
+        vbar = widget.vbar
+        widget.config(yscrollcommand=lambda first, last: (vbar.set(first, last), self.schedule()))
+        self.schedule()
+
+    def set_keywords(self, names):
+        """Highlight mentions of these lorebook entry names; retags the visible lines when they changed."""
+        keys = frozenset(key for key in map(keyword_key, names) if key)
+        if keys == self.keywords:
+            return
+        self.keywords = keys
+        self.max_keyword_words = max((key.count(" ") + 1 for key in keys), default=0)
+        self.current = [False] * len(self.document.lines)
+        self.schedule()
+
+    def on_edit(self, row, removed, added):
+        if removed is None:
+            self.current = [False] * added
+        else:
+            self.current[row:row + removed] = [False] * added
+        self.schedule()
+
+    def schedule(self):
+        if self.pending is None:
+            self.pending = self.widget.after(self.delay_ms, self.refresh)
+
+    def refresh(self):
+        self.pending = None
+        if not self.widget.winfo_exists():
+            return
+        first = int(self.widget.index("@0,0").split(".")[0]) - 1
+        last = int(self.widget.index(f"@0,{self.widget.winfo_height()}").split(".")[0]) - 1
+        first = max(first - self.margin_lines, 0)
+        last = min(last + self.margin_lines, len(self.document.lines) - 1)
+
+        stale = [row for row in range(first, last + 1) if not self.current[row]]
+        if not stale:
+            return
+        ranges = {tag: [] for tag in HIGHLIGHT_TAGS}
+        lines = self.document.lines
+        for row in stale:
+            for tag, start, end in line_spans(lines[row], self.keywords, self.max_keyword_words):
+                ranges[tag] += (f"{row + 1}.{start}", f"{row + 1}.{end}")
+            self.current[row] = True
+        # Clear old tags once per run of consecutive stale lines, then add each tag with one call
+        runs = []
+        for row in stale:
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+        for tag in HIGHLIGHT_TAGS:
+            for start_row, end_row in runs:
+                self.widget.tag_remove(tag, f"{start_row + 1}.0", f"{end_row + 1}.end")
+            if ranges[tag]:
+                self.widget.tag_add(tag, *ranges[tag])
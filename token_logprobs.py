@@ -0,0 +1,123 @@
+import math
+from array import array
+from bisect import bisect_right
+
+def parse_top_logprobs(entry):
+    """Normalise one position's top logprobs into (token, logprob) pairs, best first."""
+    if isinstance(entry, dict):  # OpenAI / vLLM completions: {token: logprob}
+        pairs = entry.items()
+    elif isinstance(entry, list):  # llama.cpp style: [{"token": ..., "logprob": ...}]
+        pairs = ((item.get("token"), item.get("logprob")) for item in entry if isinstance(item, dict))
+    else:
+        return []
+    return sorted(((token, logprob) for token, logprob in pairs if token is not None and logprob is not None),
+                  key=lambda pair: -pair[1])
+
+class TokenLogprobs:
+    """
+    Per-token log probabilities of one generated span, kept in flat typed arrays.
+
+    Every token costs a few fixed-size slots instead of a dict per token: its start offset within
+    the span, its logprob and top_n (alternative, logprob) pairs padded with -1. Token strings are
+    interned, so the handful of distinct tokens that recur across a long generation are stored once.
+    """
+    def __init__(self, top_n):
+        self.top_n = top_n
+        self.strings = []
+        self.string_ids = {}
+        self.token_ids = array('i')
+        self.offsets = array('i')  # start character of each token within the span
+        self.logprobs = array('f')
+        self.alt_ids = array('i')  # top_n entries per token, -1 where the server sent fewer
+        self.alt_logprobs = array('f')
+        self.length = 0  # characters covered by the recorded tokens
+
+    def __len__(self):
+        return len(self.token_ids)
+
+    def intern(self, token):
+        string_id = self.string_ids.get(token)
+        if string_id is None:
+            string_id = self.string_ids[token] = len(self.strings)
+            self.strings.append(token)
+        return string_id
+
+    def append(self, token, logprob=math.nan, top=()):
+        self.token_ids.append(self.intern(token))
+        self.offsets.append(self.length)
+        self.logprobs.append(logprob if logprob is not None else math.nan)
+        top = list(top)[:self.top_n]
+        for alternative, alternative_logprob in top:
+            self.alt_ids.append(self.intern(alternative))
+            self.alt_logprobs.append(alternative_logprob)
+        padding = self.top_n - len(top)
+        self.alt_ids.extend([-1] * padding)
+        self.alt_logprobs.extend([math.nan] * padding)
+        self.length += len(token)
+
+    def add_chunk(self, chunk, logprobs):
+        """
+        Record a streamed chunk and its 'logprobs' payload.
+
+        When the payload is missing or its tokens do not spell out the chunk, the chunk is recorded
+        as one token without alternatives so offsets stay aligned with the text.
+        """
+        tokens = (logprobs or {}).get("tokens") or []
+        if not tokens or "".join(tokens) != chunk:
+            self.append(chunk)
+            return
+        token_logprobs = logprobs.get("token_logprobs") or []
+        top_logprobs = logprobs.get("top_logprobs") or []
+        for position, token in enumerate(tokens):
+            logprob = token_logprobs[position] if position < len(token_logprobs) else None
+            top = parse_top_logprobs(top_logprobs[position]) if position < len(top_logprobs) else []
+            self.append(token, logprob, top)
+
+    def token_at(self, offset):
+        """Index of the token covering character offset within the span, or None."""
+        if not 0 <= offset < self.length:
+            return None
+        return bisect_right(self.offsets, offset) - 1
+
+    def token(self, index):
+        return self.strings[self.token_ids[index]]
+
+    def span(self, index):
+        """(start, end) character offsets of a token within the span."""
+        return self.offsets[index], self.offsets[index] + len(self.token(index))
+
+    def probability(self, index):
+        return math.exp(self.logprobs[index])
+
+    def alternatives(self, index):
+        """(token, probability) pairs the model considered at this position, best first, without the chosen token."""
+        chosen = self.token(index)
+        base = index * self.top_n
+        results = []
+        for slot in range(base, base + self.top_n):
+            string_id = self.alt_ids[slot]
+            if string_id >= 0 and self.strings[string_id] != chosen:
+                results.append((self.strings[string_id], math.exp(self.alt_logprobs[slot])))
+        return results
+
+    def alternative_logprob(self, index, token):
+        base = index * self.top_n
+        for slot in range(base, base + self.top_n):
+            string_id = self.alt_ids[slot]
+            if string_id >= 0 and self.strings[string_id] == token:
+                return self.alt_logprobs[slot]
+        return math.nan
+
+    def truncate(self, index):
+        """Forget the token at index and everything after it."""
+        if index >= len(self):
+            return
+        self.length = self.offsets[index]
+        del self.token_ids[index:]
+        del self.offsets[index:]
+        del self.logprobs[index:]
+        del self.alt_ids[index * self.top_n:]
+        del self.alt_logprobs[index * self.top_n:]
+
+    def text(self):
+        return "".join(self.strings[string_id] for string_id in self.token_ids)
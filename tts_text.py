@@ -0,0 +1,14 @@
+# Markdown emphasis and heading marks are read aloud literally by TTS engines
+STRIPPED_CHARACTERS = str.maketrans("", "", "*#")
+
+def treat_text(text: str) -> str:
+    """
+    Removes all asterisks ('*') and hashes ('#') from the input text.
+    """
+    return text.translate(STRIPPED_CHARACTERS)
+
+def split_text(text: str, max_length: int = 1000) -> list:
+    """
+    Splits the text into chunks of a specified maximum length.
+    """
+    return [text[i:i + max_length] for i in range(0, len(text), max_length)]